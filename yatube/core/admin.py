@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'status',
+        'progress',
+        'attempts',
+        'run_at',
+        'finished',
+    )
+    list_filter = ('status', 'name')
+    readonly_fields = ('created', 'started', 'finished', 'last_error')
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Task, TaskAdmin)
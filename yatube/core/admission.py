@@ -0,0 +1,131 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import Resolver404, resolve
+
+METRICS_KEY = 'admission:{}:{}'
+EVENTS = ('shed', 'stale', 'degraded')
+# Вес нового замера в скользящем среднем времени ожидания.
+QUEUE_SMOOTHING = 0.2
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def request_kind(request):
+    if request.path.startswith('/admin/'):
+        return 'admin'
+    if request.method not in SAFE_METHODS:
+        return 'write'
+    return 'read'
+
+
+def stale_key(request):
+    """Ключ сохранённой копии страницы — только для анонимных чтений.
+
+    Копии хранятся лишь для страниц из ADMISSION_STALE_URLS и без
+    параметров, кроме номера страницы: иначе запросами с ?x=N любой
+    мог бы вытеснить из кеша полезные копии.
+    """
+    if (request.method != 'GET'
+            or request.path.startswith('/admin/')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES):
+        return None
+    page = request.GET.get('page', '1')
+    if set(request.GET) - {'page'} or not page.isdigit() or len(page) > 6:
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    if match.view_name not in getattr(settings, 'ADMISSION_STALE_URLS', ()):
+        return None
+    return f'admission:stale:{request.path}?page={int(page)}'
+
+
+def stale_cache():
+    return caches[getattr(settings, 'ADMISSION_STALE_CACHE', 'default')]
+
+
+class LoadState:
+    """Нагрузка на процесс: запросы в работе и время ожидания слота."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = {}
+        self.queue_time = {}
+        self.mode = 'normal'
+
+    def enter(self, kind, waited):
+        with self._lock:
+            self.in_flight[kind] = self.in_flight.get(kind, 0) + 1
+            average = self.queue_time.get(kind, waited)
+            self.queue_time[kind] = (
+                average + (waited - average) * QUEUE_SMOOTHING)
+
+    def leave(self, kind):
+        with self._lock:
+            self.in_flight[kind] -= 1
+
+    def degraded(self, read_limit):
+        """Пора ли отдавать чтения из кеша: БД уже не справляется."""
+        threshold = getattr(settings, 'ADMISSION_DEGRADED_AT', 0.8)
+        max_queue = getattr(settings, 'ADMISSION_DEGRADED_QUEUE_TIME', 0.2)
+        reading = self.in_flight.get('read', 0)
+        busy = bool(read_limit) and reading > 0 and (
+            reading >= read_limit * threshold
+            or self.queue_time.get('read', 0) >= max_queue)
+        mode = 'degraded' if busy else 'normal'
+        if mode != self.mode:
+            self.mode = mode
+            if busy:
+                record('degraded')
+        return busy
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'in_flight': dict(self.in_flight),
+                'queue_ms': {kind: round(seconds * 1000, 1)
+                             for kind, seconds in self.queue_time.items()},
+            }
+
+
+state = LoadState()
+
+
+def record(event, kind='all'):
+    key = METRICS_KEY.format(event, kind)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def reject(kind):
+    record('shed')
+    record('shed', kind)
+    retry_after = getattr(settings, 'ADMISSION_RETRY_AFTER', 5)
+    response = HttpResponse(
+        render_to_string('core/503.html', {'retry_after': retry_after}),
+        status=503)
+    response['Retry-After'] = str(retry_after)
+    response['X-Load-Mode'] = state.mode
+    return response
+
+
+def metrics():
+    """Режим и нагрузка этого процесса плюс общие счётчики событий."""
+    result = state.snapshot()
+    result['events'] = {
+        event: cache.get(METRICS_KEY.format(event, 'all'), 0)
+        for event in EVENTS
+    }
+    result['shed'] = {
+        kind: cache.get(METRICS_KEY.format('shed', kind), 0)
+        for kind in ('read', 'write', 'admin')
+    }
+    return result
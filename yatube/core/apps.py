@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import querycache
+        from .auth import connect_signals
+        connect_signals()
+        querycache.install()
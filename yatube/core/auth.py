@@ -0,0 +1,59 @@
+import copy
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.signals import post_delete, post_save
+
+from . import versions
+
+# Сколько секунд процесс доверяет своей копии пользователя.
+USER_CACHE_TTL = 60
+VERSION_KEY = 'auth:user:{}:version'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который не читает auth_user на каждый запрос.
+
+    Пользователь из сессии хранится в памяти процесса USER_CACHE_TTL
+    секунд. Сохранение или удаление пользователя (смена пароля, правка
+    профиля, вход с обновлением last_login) меняет его версию в общем
+    для процессов core.versions, и все процессы перечитывают его из БД:
+    после смены пароля старые сессии перестают действовать сразу.
+    """
+    _users = {}
+    _lock = threading.Lock()
+
+    def get_user(self, user_id):
+        version = versions.get(VERSION_KEY.format(user_id))
+        entry = self._users.get(user_id)
+        if (entry is not None and entry[0] > time.monotonic()
+                and entry[1] == version):
+            # Копия: код запроса может менять поля request.user.
+            return copy.copy(entry[2])
+        user = super().get_user(user_id)
+        if user is not None:
+            with self._lock:
+                self._users[user_id] = (
+                    time.monotonic() + USER_CACHE_TTL, version,
+                    copy.copy(user))
+        return user
+
+    @classmethod
+    def invalidate(cls, user_id):
+        versions.bump(VERSION_KEY.format(user_id))
+        with cls._lock:
+            cls._users.pop(user_id, None)
+
+
+def user_changed(sender, instance, **kwargs):
+    CachedModelBackend.invalidate(instance.pk)
+
+
+def connect_signals():
+    user_model = get_user_model()
+    post_save.connect(user_changed, sender=user_model,
+                      dispatch_uid='core.auth.user_saved')
+    post_delete.connect(user_changed, sender=user_model,
+                        dispatch_uid='core.auth.user_deleted')
@@ -0,0 +1,96 @@
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+from django.core.files.move import file_move_safe
+
+LOCK_FILENAME = 'cache.lock'
+# Как часто (с) процесс проверяет, не переполнен ли кеш: подсчёт записей —
+# это чтение всего каталога, а FileBasedCache делает его на каждый set().
+CULL_CHECK_INTERVAL = 1
+
+
+class SharedFileCache(FileBasedCache):
+    """Файловый кеш с атомарными add() и incr() для нескольких процессов.
+
+    Счётчики ограничителя частоты запросов должны быть общими для всех
+    воркеров сервера на хосте: locmem у каждого процесса свой, а у
+    FileBasedCache инкремент — это чтение и запись без блокировки.
+    Здесь обе операции выполняются под межпроцессной блокировкой файла.
+    При переполнении сначала удаляются истёкшие записи и лишь потом
+    случайные живые.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._next_cull_check = 0
+
+    @contextmanager
+    def lock(self):
+        self._createdir()
+        with open(os.path.join(self._dir, LOCK_FILENAME), 'ab') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock)
+
+    def add(self, key, value, timeout=None, version=None):
+        with self.lock():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        """Прибавляет под блокировкой, не трогая срок жизни записи.
+
+        BaseCache.incr() — это get() и set() с таймаутом по умолчанию:
+        часовое окно лимита жило бы пять минут после последнего запроса.
+        """
+        fname = self._key_to_file(key, version)
+        with self.lock():
+            try:
+                with open(fname, 'rb') as file:
+                    expiry = pickle.load(file)
+                    value = pickle.loads(zlib.decompress(file.read()))
+            except (FileNotFoundError, EOFError):
+                raise ValueError(f"Key '{key}' not found")
+            if expiry is not None and expiry < time.time():
+                self._delete(fname)
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            self._write_file(fname, expiry, value)
+            return value
+
+    def _write_file(self, fname, expiry, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        renamed = False
+        try:
+            with open(fd, 'wb') as file:
+                file.write(pickle.dumps(expiry, self.pickle_protocol))
+                file.write(zlib.compress(
+                    pickle.dumps(value, self.pickle_protocol)))
+            file_move_safe(tmp_path, fname, allow_overwrite=True)
+            renamed = True
+        finally:
+            if not renamed:
+                os.remove(tmp_path)
+
+    def _cull(self):
+        now = time.monotonic()
+        if now < self._next_cull_check:
+            return
+        self._next_cull_check = now + CULL_CHECK_INTERVAL
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        for name in filelist:
+            try:
+                with open(name, 'rb') as file:
+                    self._is_expired(file)
+            except FileNotFoundError:
+                pass
+        super()._cull()
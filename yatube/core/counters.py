@@ -0,0 +1,179 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд прибавления копятся в памяти до записи в БД.
+FLUSH_INTERVAL = 10
+# Сколько строк с несохранёнными прибавлениями держать, не дожидаясь
+# интервала; столько же строк уходит в один INSERT.
+MAX_PENDING = 400
+
+counters = []
+# Фоновый поток записи и процесс, в котором он запущен: после fork
+# поток в дочернем процессе не живёт и запускается заново.
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+# Ключ WSGI environ у служебных запросов (например, отрисовки страниц
+# на диск): их просмотры не считаются.
+INTERNAL_REQUEST = 'yatube.internal'
+
+
+class BufferedCounter:
+    """Счётчик в таблице ``model`` с отложенной записью.
+
+    incr() только прибавляет к словарю в памяти процесса; раз в
+    COUNTERS_FLUSH_INTERVAL секунд (или при MAX_PENDING строках) все
+    накопленные прибавления записываются одним
+    ``INSERT ... VALUES (...), (...) ON CONFLICT DO UPDATE SET f = f + ...``.
+    Запись относительная, поэтому процессы не затирают чужие прибавления.
+    Записывает и следующий incr(), и фоновый поток процесса — даже если
+    просмотров больше нет. При падении процесса теряется не больше одного
+    интервала его прибавлений; при штатной остановке буфер сбрасывается
+    через atexit.
+    """
+
+    def __init__(self, model, field):
+        self.model_label = model
+        self.field = field
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed = time.monotonic()
+        counters.append(self)
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def interval(self):
+        return getattr(settings, 'COUNTERS_FLUSH_INTERVAL', FLUSH_INTERVAL)
+
+    def incr(self, pk, amount=1):
+        with self._lock:
+            self._pending[pk] = self._pending.get(pk, 0) + amount
+            due = (len(self._pending) >= MAX_PENDING or self.due())
+        if due:
+            self.flush()
+        elif self.interval() > 0:
+            start_flusher(self.interval())
+
+    def due(self):
+        return time.monotonic() - self._flushed >= self.interval()
+
+    def value(self, pk, stored=None):
+        """Примерное текущее значение: из БД плюс ещё не записанное.
+
+        ``stored`` — уже прочитанное из БД значение, чтобы не делать
+        лишний запрос. Несохранённые прибавления других процессов
+        не видны — не больше чем за один интервал.
+        """
+        if stored is None:
+            stored = self.model.objects.filter(pk=pk).values_list(
+                self.field, flat=True).first() or 0
+        return stored + self._pending.get(pk, 0)
+
+    def _sql(self, rows):
+        qn = connection.ops.quote_name
+        meta = self.model._meta
+        table, key, field = (qn(meta.db_table), qn(meta.pk.column),
+                             qn(self.field))
+        values = ', '.join(['(%s, %s)'] * rows)
+        return (
+            f'INSERT INTO {table} ({key}, {field}) VALUES {values} '
+            f'ON CONFLICT ({key}) DO UPDATE SET '
+            f'{field} = {table}.{field} + excluded.{field}'
+        )
+
+    def _existing(self, pending):
+        # Строку счётчика нельзя вставить для уже удалённого объекта.
+        relation = self.model._meta.pk.remote_field
+        if relation is None or not pending:
+            return pending
+        alive = set(relation.model.objects.filter(
+            pk__in=pending).values_list('pk', flat=True))
+        return {pk: amount for pk, amount in pending.items() if pk in alive}
+
+    def flush(self):
+        """Записывает накопленные прибавления. Возвращает число строк."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed = time.monotonic()
+        try:
+            pending = self._existing(pending)
+            if not pending:
+                return 0
+            params = [value for item in pending.items() for value in item]
+            with connection.cursor() as cursor:
+                cursor.execute(self._sql(len(pending)), params)
+        except DatabaseError:
+            # БД занята — прибавления вернутся в буфер до следующей записи.
+            logger.warning('Не удалось записать счётчик %s.%s',
+                           self.model_label, self.field, exc_info=True)
+            with self._lock:
+                for pk, amount in pending.items():
+                    self._pending[pk] = self._pending.get(pk, 0) + amount
+            return 0
+        return len(pending)
+
+
+def counts(counter, kwarg):
+    """Прибавляет к ``counter`` единицу за каждый успешный GET к view.
+
+    Ключ строки берётся из аргумента view ``kwarg``. Декоратор ставится
+    снаружи coalesce, чтобы считались и склеенные запросы. Служебные
+    запросы с INTERNAL_REQUEST в environ не считаются.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if (request.method == 'GET' and response.status_code == 200
+                    and not request.META.get(INTERNAL_REQUEST)):
+                counter.incr(kwargs[kwarg])
+            return response
+        return wrapper
+    return decorator
+
+
+def flush_due():
+    """Записывает счётчики, у которых прошёл интервал. Число строк."""
+    return sum(counter.flush() for counter in counters
+               if counter._pending and counter.due())
+
+
+def _flush_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_due()
+        finally:
+            # У потока своё соединение: не держим его между записями.
+            connection.close()
+
+
+def start_flusher(interval):
+    """Запускает фоновую запись счётчиков процесса, если её ещё нет."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        threading.Thread(target=_flush_periodically, args=(interval,),
+                         name='counters-flush', daemon=True).start()
+        _flusher_pid = os.getpid()
+
+
+@atexit.register
+def flush_all():
+    for counter in counters:
+        counter.flush()
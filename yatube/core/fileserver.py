@@ -0,0 +1,222 @@
+import json
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.core.handlers.wsgi import get_path_info
+from django.http.cookie import parse_cookie
+
+BLOCK_SIZE = 64 * 1024
+# Файлы с хешем в имени не меняются никогда: manifest-статика
+# (bootstrap.3c1f1a2b9e4d.min.css) и картинки постов (posts/ab/cd/<sha256>).
+IMMUTABLE_NAME = re.compile(r'\.[0-9a-f]{12}\.|[0-9a-f]{64}\.')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'public, no-cache'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+PAGE_QUERY = re.compile(r'^page=(\d+)$')
+# Заголовки ответа Django (X-Frame-Options и другие заголовки
+# безопасности), которые posts.prerender сохраняет рядом со страницей.
+HEADERS_SUFFIX = '.headers'
+
+
+class FileServer:
+    """WSGI-обёртка, отдающая статику и медиа в обход Django.
+
+    Запросы к STATIC_URL и MEDIA_URL обслуживаются прямо с диска:
+    с ETag и ответом 304, поддержкой Range, заранее сжатыми .br/.gz
+    вариантами статики и wsgi.file_wrapper, через который сервер
+    (gunicorn, uWSGI) может отдать файл системным вызовом sendfile.
+    Посетителям без сессии страницы отдаются из PRERENDER_ROOT, если
+    posts.prerender их там сохранил. Всё, чего нет на диске, уходит
+    в приложение как обычно.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            found = self.find(environ.get('PATH_INFO', ''))
+            if found is not None:
+                return self.serve(environ, start_response, *found)
+            page = self.find_page(environ)
+            page_headers = None if page is None else self.page_headers(page)
+            if page_headers is not None:
+                return self.serve(environ, start_response, page, True,
+                                  vary='Accept-Encoding, Cookie',
+                                  extra_headers=page_headers)
+        return self.application(environ, start_response)
+
+    def mounts(self):
+        return [
+            (settings.STATIC_URL, settings.STATIC_ROOT, True),
+            (settings.MEDIA_URL, settings.MEDIA_ROOT, False),
+        ]
+
+    def find(self, path):
+        for prefix, root, compressed in self.mounts():
+            if not prefix or not root or not path.startswith(prefix):
+                continue
+            root = os.path.realpath(root)
+            full_path = os.path.realpath(
+                os.path.join(root, path[len(prefix):]))
+            if not full_path.startswith(root + os.sep):
+                return None
+            if os.path.isfile(full_path):
+                return full_path, compressed
+        return None
+
+    def find_page(self, environ):
+        """Сохранённая страница для анонимного запроса или None.
+
+        Любая cookie, кроме CSRF, может менять страницу (сессия,
+        сообщения), поэтому такие запросы идут в Django.
+        """
+        root = getattr(settings, 'PRERENDER_ROOT', None)
+        path = get_path_info(environ)
+        if not root or not path.endswith('/'):
+            return None
+        # Как и posts.prerender.file_name: /profile/../ — это профиль
+        # пользователя «..», а не главная страница.
+        if any(part in ('', '.', '..') for part in path.split('/')[1:-1]):
+            return None
+        cookies = parse_cookie(environ.get('HTTP_COOKIE', ''))
+        if set(cookies) - {settings.CSRF_COOKIE_NAME}:
+            return None
+        query = environ.get('QUERY_STRING', '')
+        name = 'index.html'
+        if query:
+            match = PAGE_QUERY.match(query)
+            if match is None:
+                return None
+            name = f'page-{match.group(1)}.html'
+        root = os.path.realpath(root)
+        full_path = os.path.realpath(
+            os.path.join(root, path.lstrip('/'), name))
+        if full_path.startswith(root + os.sep) and os.path.isfile(full_path):
+            return full_path
+        return None
+
+    def page_headers(self, path):
+        """Сохранённые заголовки страницы; без них страницу строит Django."""
+        try:
+            with open(path + HEADERS_SUFFIX, encoding='utf-8') as file:
+                return [(str(name), str(value))
+                        for name, value in json.load(file)]
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def serve(self, environ, start_response, path, compressed,
+              vary='Accept-Encoding', extra_headers=()):
+        headers = [('Accept-Ranges', 'bytes'), *extra_headers]
+        content_type = mimetypes.guess_type(path)[0]
+        if content_type == 'text/html':
+            content_type += '; charset=utf-8'
+        headers.append(
+            ('Content-Type', content_type or 'application/octet-stream'))
+        range_header = environ.get('HTTP_RANGE')
+        if compressed:
+            headers.append(('Vary', vary))
+            if not range_header:
+                path = self.negotiate(environ, path, headers)
+        stat = os.stat(path)
+        etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        headers += [
+            ('ETag', etag),
+            ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+            ('Cache-Control', IMMUTABLE_CACHE
+             if IMMUTABLE_NAME.search(os.path.basename(path))
+             else REVALIDATE_CACHE),
+        ]
+        if not_modified(environ, etag, stat.st_mtime):
+            start_response('304 Not Modified', headers)
+            return []
+
+        size = stat.st_size
+        status = '200 OK'
+        start, length = 0, size
+        if range_header and environ.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = parse_range(range_header, size)
+            if byte_range is False:
+                headers.append(('Content-Range', f'bytes */{size}'))
+                headers.append(('Content-Length', '0'))
+                start_response('416 Range Not Satisfiable', headers)
+                return []
+            if byte_range is not None:
+                start, length = byte_range
+                status = '206 Partial Content'
+                headers.append((
+                    'Content-Range',
+                    f'bytes {start}-{start + length - 1}/{size}'))
+        headers.append(('Content-Length', str(length)))
+        start_response(status, headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file = open(path, 'rb')
+        if length == size:
+            file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+            return file_wrapper(file, BLOCK_SIZE)
+        file.seek(start)
+        return read_range(file, length)
+
+    def negotiate(self, environ, path, headers):
+        accepted = environ.get('HTTP_ACCEPT_ENCODING', '')
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                headers.append(('Content-Encoding', encoding))
+                return path + suffix
+        return path
+
+
+def not_modified(environ, etag, mtime):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def parse_range(header, size):
+    """Разбирает заголовок Range с одним диапазоном.
+
+    Возвращает (начало, длина), None — если заголовок стоит проигнорировать
+    (несколько диапазонов, чужие единицы), и False для диапазона за
+    пределами файла.
+    """
+    match = RANGE_HEADER.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = min(int(last), size)
+        if length == 0:
+            return False
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end - start + 1
+
+
+def read_range(file, length):
+    with file:
+        while length > 0:
+            block = file.read(min(BLOCK_SIZE, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
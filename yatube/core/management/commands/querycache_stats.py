@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core import querycache
+
+
+class Command(BaseCommand):
+    help = 'Показывает долю попаданий кеша запросов по моделям'
+
+    def handle(self, *args, **options):
+        for label, counts in querycache.stats().items():
+            self.stdout.write(
+                f'{label}: попаданий {counts["hit"]}, промахов '
+                f'{counts["miss"]}, доля {counts["ratio"]:.0%}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from core import ratelimit
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько запросов пропустил и отклонил ratelimit'
+
+    def handle(self, *args, **options):
+        # Области регистрируются при импорте view-функций.
+        get_resolver().url_patterns
+        for scope, metrics in ratelimit.stats().items():
+            self.stdout.write(f'{scope}: {metrics}')
@@ -0,0 +1,66 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import tasks
+
+
+# Как часто (с) воркер возвращает в очередь задачи умерших воркеров.
+REQUEUE_INTERVAL = 60
+
+
+def work(poll_interval, once):
+    tasks.autodiscover()
+    requeued = time.monotonic()
+    while True:
+        if time.monotonic() - requeued >= REQUEUE_INTERVAL:
+            tasks.requeue_stale()
+            requeued = time.monotonic()
+        done = tasks.run_pending()
+        if once:
+            return
+        if not done:
+            time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Запускает пул воркеров фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Число процессов-воркеров')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти')
+        parser.add_argument('--stats', action='store_true',
+                            help='Показать метрики очереди и выйти')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for name, statuses in sorted(tasks.task_stats().items()):
+                self.stdout.write(f'{name}: {statuses}')
+            return
+        requeued = tasks.requeue_stale()
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь задач: {requeued}')
+        # Соединения с БД нельзя делить между процессами.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=work,
+                args=(options['poll_interval'], options['once']),
+                daemon=True,
+            )
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
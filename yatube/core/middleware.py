@@ -0,0 +1,175 @@
+import gzip
+import re
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import admission
+from .singleflight import freeze_response, thaw_response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен
+    brotli = None
+
+MIN_COMPRESS_SIZE = 200
+# Server-Sent Events не сжимаются: буфер компрессора задерживал бы
+# события, а сжимать каждое по отдельности бессмысленно.
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/(?!event-stream)|'
+    r'application/(json|javascript|xml|atom\+xml|rss\+xml)|'
+    r'image/svg\+xml)'
+)
+ACCEPT_ENCODING = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q=([0-9.]+))?')
+
+
+def accepted_encoding(header):
+    """Выбирает кодировку ответа по заголовку Accept-Encoding.
+
+    brotli (если модуль установлен) предпочтительнее gzip при равном q.
+    """
+    weights = {}
+    for match in ACCEPT_ENCODING.finditer(header or ''):
+        name, quality = match.group(1).lower(), match.group(2)
+        try:
+            weights[name] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    for encoding in candidates:
+        weight = weights.get(encoding, weights.get('*', 0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = encoding, weight
+    return best[0] if best else None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data)
+    return gzip.compress(data, 6, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Сжимает поток, сбрасывая компрессор после каждой части.
+
+    Так клиент получает и может отрисовать каждую часть потокового
+    рендеринга сразу, не дожидаясь конца страницы.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """Сжимает ответы brotli или gzip — по тому, что принимает клиент.
+
+    Пропускает маленькие, уже сжатые и нетекстовые ответы, потоковые
+    ответы сжимает по частям.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not self.should_compress(response):
+            return response
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < MIN_COMPRESS_SIZE:
+                return response
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        if response.has_header('ETag'):
+            # Сжатое тело не побайтно равно исходному.
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        response['Content-Encoding'] = encoding
+        return response
+
+    def should_compress(self, response):
+        if response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '')
+        return bool(COMPRESSIBLE_TYPES.match(content_type))
+
+
+class AdmissionControlMiddleware:
+    """Ограничивает число одновременно обрабатываемых запросов.
+
+    Запросы делятся на классы: admin (всё под /admin/), write (небезопасные
+    методы) и read. На класс в процессе приходится не больше
+    ADMISSION_LIMITS[класс] запросов; остальные ждут свободного места
+    не дольше ADMISSION_QUEUE_TIMEOUT[класс] секунд, а потом получают 503
+    с Retry-After. Когда чтений в работе больше доли ADMISSION_DEGRADED_AT
+    от лимита, процесс переходит в деградированный режим: admin-запросы
+    сразу отклоняются, а анонимным чтениям отдаётся последняя сохранённая
+    копия страницы, даже устаревшая, без обращения к БД.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limits = dict(getattr(settings, 'ADMISSION_LIMITS', {}))
+        self.slots = {
+            kind: threading.BoundedSemaphore(limit)
+            for kind, limit in self.limits.items()
+        }
+
+    def __call__(self, request):
+        kind = admission.request_kind(request)
+        slot = self.slots.get(kind)
+        if slot is None:
+            return self.get_response(request)
+        degraded = admission.state.degraded(self.limits.get('read'))
+        stale_key = admission.stale_key(request)
+        if degraded and kind == 'admin':
+            return admission.reject(kind)
+        if degraded and stale_key:
+            frozen = admission.stale_cache().get(stale_key)
+            if frozen is not None:
+                admission.record('stale')
+                response = thaw_response(frozen)
+                response['X-Load-Mode'] = 'degraded'
+                return response
+        started = time.monotonic()
+        timeout = getattr(settings, 'ADMISSION_QUEUE_TIMEOUT', {}).get(kind, 0)
+        if not slot.acquire(timeout=timeout):
+            return admission.reject(kind)
+        admission.state.enter(kind, time.monotonic() - started)
+        try:
+            response = self.get_response(request)
+        finally:
+            admission.state.leave(kind)
+            slot.release()
+        if stale_key:
+            frozen = freeze_response(response)
+            if frozen is not None:
+                admission.stale_cache().set(stale_key, frozen, getattr(
+                    settings, 'ADMISSION_STALE_TIMEOUT', 600))
+        return response
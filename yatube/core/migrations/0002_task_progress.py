@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс, %'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=255)
+    payload = models.TextField('Аргументы', default='{}')
+    status = models.CharField('Статус',
+                              max_length=16,
+                              choices=STATUS_CHOICES,
+                              default=PENDING)
+    progress = models.PositiveSmallIntegerField('Прогресс, %', default=0)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_retries = models.PositiveSmallIntegerField('Повторов', default=3)
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Начата', blank=True, null=True)
+    finished = models.DateTimeField('Завершена', blank=True, null=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ('run_at',)
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='task_status_run_at'),
+        ]
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+
+    def __str__(self):
+        return f'{self.name} [{self.status}]'
@@ -0,0 +1,71 @@
+import threading
+from collections import deque
+
+# Сколько недоставленных сообщений держит один подписчик.
+MAX_BACKLOG = 100
+
+
+class Subscription:
+    """Подписка на каналы: очередь сообщений и событие их появления.
+
+    Ждущий подписчик не занимает ничего, кроме объекта Event, поэтому
+    тысячи открытых соединений стоят только своих потоков (или
+    гринлетов под gevent).
+    """
+
+    def __init__(self, channels):
+        self.channels = frozenset(channels)
+        self.messages = deque(maxlen=MAX_BACKLOG)
+        self.ready = threading.Event()
+
+    def push(self, message):
+        self.messages.append(message)
+        self.ready.set()
+
+    def get(self, timeout=None):
+        """Сообщения, пришедшие с прошлого вызова; ждёт до ``timeout``."""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        messages = []
+        while self.messages:
+            messages.append(self.messages.popleft())
+        return messages
+
+
+class Hub:
+    """Публикация и подписка внутри процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def publish(self, channels, message):
+        """Отдаёт сообщение всем подписчикам любого из каналов — по разу."""
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._channels.get(channel, ()))
+        for subscription in targets:
+            subscription.push(message)
+        return len(targets)
+
+    def subscribers(self):
+        with self._lock:
+            return len(set().union(*self._channels.values()))
@@ -0,0 +1,195 @@
+import hashlib
+import random
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, models
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import versions
+
+VERSION_KEY = 'querycache:table:{}'
+STATS_KEY = 'querycache:stats:{}:{}'
+STATS = ('hit', 'miss')
+# Какая доля обращений попадает в статистику: каждое учтённое — это
+# запись в общий кеш под межпроцессной блокировкой.
+STATS_SAMPLE = 0.01
+WRITE_SQL = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE|'
+    r'DELETE\s+FROM)\s+[`"\[]?(\w+)',
+    re.IGNORECASE,
+)
+
+
+def get_cache():
+    return caches[getattr(settings, 'QUERYCACHE_ALIAS', 'default')]
+
+
+def written_table(sql):
+    match = WRITE_SQL.match(sql)
+    return match.group(1) if match else None
+
+
+def bump(table):
+    versions.bump(VERSION_KEY.format(table))
+
+
+def table_versions(tables):
+    """Текущие версии таблиц: меняются при любой записи в них.
+
+    Версии лежат в core.versions: они не вытесняются вместе
+    с результатами и после пропажи не повторяются.
+    """
+    tables = sorted(tables)
+    current = versions.get_many([VERSION_KEY.format(t) for t in tables])
+    return {t: current[VERSION_KEY.format(t)] for t in tables}
+
+
+def invalidate_on_write(execute, sql, params, many, context):
+    """Обёртка курсора: любая запись в таблицу меняет её версию.
+
+    Так ловятся и save(), и update(), и bulk_create(), и сырой SQL.
+    В транзакции версия меняется ещё раз после коммита: иначе другой
+    процесс мог бы успеть закешировать данные до их фиксации.
+    """
+    result = execute(sql, params, many, context)
+    table = written_table(sql)
+    if table is not None:
+        bump(table)
+        connection = context['connection']
+        if connection.in_atomic_block:
+            connection.on_commit(lambda: bump(table))
+    return result
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    if invalidate_on_write not in connection.execute_wrappers:
+        connection.execute_wrappers.append(invalidate_on_write)
+
+
+def install():
+    """Подключает обёртку и к уже открытым соединениям."""
+    for connection in connections.all():
+        install_wrapper(None, connection)
+
+
+def stats_sample():
+    return getattr(settings, 'QUERYCACHE_STATS_SAMPLE', STATS_SAMPLE)
+
+
+def record(model, stat):
+    if random.random() >= stats_sample():
+        return
+    cache = get_cache()
+    key = STATS_KEY.format(model._meta.label, stat)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def stats():
+    """Попадания и промахи кеша запросов по моделям, где он работал.
+
+    Числа оценочные: учитывается доля QUERYCACHE_STATS_SAMPLE обращений.
+    """
+    cache = get_cache()
+    scale = 1 / stats_sample()
+    result = {}
+    for model in apps.get_models():
+        label = model._meta.label
+        counts = {stat: round(cache.get(STATS_KEY.format(label, stat), 0)
+                              * scale)
+                  for stat in STATS}
+        total = counts['hit'] + counts['miss']
+        if total:
+            counts['ratio'] = counts['hit'] / total
+            result[label] = counts
+    return result
+
+
+def fetch(queryset, kind, compute):
+    """Берёт результат запроса из кеша или вычисляет и сохраняет его.
+
+    Ключ — нормализованный SQL с параметрами и текущие версии всех
+    таблиц запроса. Внутри транзакции кеш не используется: там видны
+    незафиксированные изменения, которые ещё могут откатиться.
+    """
+    if connections[queryset.db].in_atomic_block:
+        return compute()
+    query = queryset.query
+    sql, params = query.get_compiler(queryset.db).as_sql()
+    versions = table_versions({
+        alias.table_name for alias in query.alias_map.values()})
+    signature = '|'.join([
+        kind, ' '.join(sql.split()), repr(params),
+        *(f'{t}={version}' for t, version in versions.items()),
+    ])
+    key = 'querycache:{}:{}'.format(
+        queryset.model._meta.label,
+        hashlib.sha1(signature.encode()).hexdigest())
+    sentinel = object()
+    cache = get_cache()
+    result = cache.get(key, sentinel)
+    if result is not sentinel:
+        record(queryset.model, 'hit')
+        return result
+    record(queryset.model, 'miss')
+    result = compute()
+    cache.set(key, result, queryset._cache_timeout)
+    return result
+
+
+class CachingQuerySet(models.QuerySet):
+    """QuerySet, результаты которого можно кешировать вызовом cached().
+
+    Group.objects.cached().get(slug=slug) выполняет SELECT только до
+    первой записи в posts_group любым процессом; дальше результат берётся
+    из кеша QUERYCACHE_ALIAS. Кешируются выборки, exists() и count().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_timeout = None
+        self._cache_enabled = False
+
+    def cached(self, timeout=None):
+        clone = self._chain()
+        clone._cache_enabled = True
+        clone._cache_timeout = (
+            timeout if timeout is not None
+            else getattr(settings, 'QUERYCACHE_TIMEOUT', 300))
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_enabled = self._cache_enabled
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _fetch_all(self):
+        if (self._cache_enabled and self._result_cache is None
+                and not self._prefetch_related_lookups):
+            self._result_cache = fetch(
+                self, 'rows', lambda: list(self._iterable_class(self)))
+        super()._fetch_all()
+
+    def exists(self):
+        if not self._cache_enabled or self._result_cache is not None:
+            return super().exists()
+        return fetch(self, 'exists', super().exists)
+
+    def count(self):
+        if not self._cache_enabled or self._result_cache is not None:
+            return super().count()
+        return fetch(self, 'count', super().count)
+
+
+def cached(model, timeout=None):
+    """Кешируемый queryset для модели без CachingQuerySet, например User."""
+    return CachingQuerySet(model=model).cached(timeout)
@@ -0,0 +1,113 @@
+import logging
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .views import too_many_requests
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+METRICS = ('allowed', 'limited')
+# Области, для которых объявлены ограничения, — для сбора метрик.
+scopes = set()
+
+
+def parse_rate(rate):
+    """Переводит '10/m' в пару (10, 60)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def get_cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def client_key(request, key):
+    if key in ('user', 'user_or_ip') and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    if key == 'user':
+        return None
+    return 'ip:' + request.META.get('REMOTE_ADDR', '')
+
+
+def _count(cache, key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Счётчик успел истечь между add() и incr().
+        cache.add(key, 1, timeout)
+        return 1
+
+
+def hit(scope, ident, limit, period, now=None):
+    """Учитывает запрос в скользящем окне.
+
+    Окно приближается двумя фиксированными: текущим и предыдущим, вес
+    которого убывает по мере того, как текущее окно заполняется. Это два
+    ключа в кеше и атомарный incr() на запрос. Возвращает 0, если запрос
+    разрешён, иначе число секунд до момента, когда его можно повторить.
+    """
+    cache = get_cache()
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now, period)
+    prefix = f'ratelimit:{scope}:{ident}'
+    current = _count(cache, f'{prefix}:{int(window)}', period * 2)
+    previous = cache.get(f'{prefix}:{int(window) - 1}', 0)
+    weight = (period - elapsed) / period
+    if previous * weight + current <= limit:
+        return 0
+    if current > limit or not previous:
+        return math.ceil(period - elapsed)
+    wait = period - elapsed - (limit - current) * period / previous
+    return max(1, math.ceil(wait))
+
+
+def record(scope, metric):
+    _count(get_cache(), f'ratelimit:metrics:{scope}:{metric}', None)
+
+
+def stats():
+    """Сколько запросов пропущено и отклонено по каждой области."""
+    cache = get_cache()
+    return {
+        scope: {
+            metric: cache.get(f'ratelimit:metrics:{scope}:{metric}', 0)
+            for metric in METRICS
+        }
+        for scope in sorted(scopes)
+    }
+
+
+def ratelimit(scope, rate=None, key='user_or_ip', methods=('POST',)):
+    """Ограничивает частоту запросов к view.
+
+    ``rate`` вида '10/m' (s, m, h, d); если не задан, берётся из
+    settings.RATELIMITS по имени области.
+    ``key`` задаёт, кого считать: 'user_or_ip' — пользователя, а анонима
+    по IP, 'user' — только пользователей, 'ip' — адрес независимо от
+    входа. Ограничения складываются, если навесить несколько декораторов.
+    Превысивший лимит получает ответ 429 с заголовком Retry-After.
+    """
+    scopes.add(scope)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            ident = client_key(request, key)
+            if request.method not in methods or ident is None:
+                return view(request, *args, **kwargs)
+            limit, period = parse_rate(rate or settings.RATELIMITS[scope])
+            retry_after = hit(scope, ident, limit, period)
+            if retry_after:
+                record(scope, 'limited')
+                logger.warning('Превышен лимит %s для %s', scope, ident)
+                return too_many_requests(request, retry_after)
+            record(scope, 'allowed')
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
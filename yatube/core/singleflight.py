@@ -0,0 +1,125 @@
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+LOCK_TIMEOUT = 10
+RESULT_TIMEOUT = 2
+POLL_INTERVAL = 0.02
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """Одно вычисление на ключ для одновременных вызовов.
+
+    Пока ведущий поток выполняет func, остальные вызовы с тем же ключом
+    ждут и получают его результат. С ``cache`` то же работает между
+    процессами: ведущий берёт блокировку cache.add() и кладёт результат
+    в кеш на RESULT_TIMEOUT секунд, остальные процессы его дожидаются.
+    Если ведущий упал или не уложился в LOCK_TIMEOUT, каждый вызов
+    вычисляет результат сам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func, cache=None):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            flight.done.wait(LOCK_TIMEOUT)
+            if flight.result is not None:
+                return flight.result
+            return func()
+        try:
+            flight.result = (self._shared(key, func, cache)
+                             if cache is not None else func())
+            return flight.result
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _shared(self, key, func, cache):
+        lock_key = f'singleflight:lock:{key}'
+        result_key = f'singleflight:result:{key}'
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                result = func()
+                if result is not None:
+                    cache.set(result_key, result, RESULT_TIMEOUT)
+                return result
+            finally:
+                cache.delete(lock_key)
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            result = cache.get(result_key)
+            if result is not None:
+                return result
+            if not cache.get(lock_key):
+                break
+            time.sleep(POLL_INTERVAL)
+        return cache.get(result_key) or func()
+
+
+flights = SingleFlight()
+
+
+def freeze_response(response):
+    """Ответ в виде, который можно раздать нескольким запросам."""
+    if response.streaming or response.cookies or response.status_code != 200:
+        return None
+    return response.content, list(response.items())
+
+
+def thaw_response(frozen):
+    content, headers = frozen
+    response = HttpResponse(content)
+    for name, value in headers:
+        response[name] = value
+    return response
+
+
+def coalesce(view):
+    """Склеивает одинаковые одновременные анонимные GET-запросы к view.
+
+    Запрос без cookie сессии не зависит от пользователя, поэтому
+    страницу, которую сейчас строит другой запрос, можно не строить
+    заново. Потоковые ответы, ответы с cookie (например, CSRF) и ошибки
+    не раздаются: такие запросы выполняются сами по себе.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method != 'GET'
+                or settings.SESSION_COOKIE_NAME in request.COOKIES):
+            return view(request, *args, **kwargs)
+        alias = getattr(settings, 'SINGLEFLIGHT_CACHE', None)
+        cache = caches[alias] if alias else None
+        own = {}
+
+        def build():
+            response = own['response'] = view(request, *args, **kwargs)
+            if request.META.get('CSRF_COOKIE_USED'):
+                return None
+            return freeze_response(response)
+
+        key = f'{view.__module__}.{view.__name__}:{request.get_full_path()}'
+        frozen = flights.do(key, build, cache)
+        if 'response' in own:
+            return own['response']
+        if frozen is None:
+            return view(request, *args, **kwargs)
+        return thaw_response(frozen)
+    return wrapper
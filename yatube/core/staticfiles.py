@@ -0,0 +1,58 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен
+    brotli = None
+
+# Форматы, которые уже сжаты и от повторного сжатия только растут.
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.svg', '.html', '.txt', '.json', '.xml', '.ico', '.map',
+)
+MIN_COMPRESS_SIZE = 256
+
+
+def compress_variants(path):
+    """Пишет рядом с файлом .gz и, если есть brotli, .br-варианты.
+
+    Вариант сохраняется, только если он действительно меньше исходника.
+    """
+    with open(path, 'rb') as source:
+        data = source.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    written = []
+    encoders = [('.gz', lambda raw: gzip.compress(raw, 9, mtime=0))]
+    if brotli is not None:
+        encoders.append(('.br', lambda raw: brotli.compress(raw)))
+    for suffix, encode in encoders:
+        compressed = encode(data)
+        if len(compressed) >= len(data):
+            continue
+        with open(path + suffix, 'wb') as target:
+            target.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и заранее сжатыми вариантами.
+
+    collectstatic кладёт рядом с bootstrap.<hash>.min.css файлы .gz и .br,
+    которые core.fileserver отдаёт клиентам, поддерживающим сжатие.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for hashed_name in sorted(hashed_names):
+            if hashed_name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_variants(self.path(hashed_name))
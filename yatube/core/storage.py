@@ -0,0 +1,85 @@
+import hashlib
+import os
+import time
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """Считает sha256 содержимого файла, не загружая его в память целиком."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем, вычисленным из их содержимого.
+
+    Файл ``posts/meme.jpg`` сохраняется как ``posts/ab/cd/abcd….jpg``:
+    одинаковые картинки всех пользователей занимают на диске одно место,
+    а миниатюры sorl-thumbnail, ключ которых строится по имени файла,
+    строятся для них один раз. Повторная запись уже существующего файла
+    не выполняется. Удаление отдельных файлов отключено — на один файл
+    может ссылаться несколько записей, поэтому сиротские файлы удаляет
+    команда сборки мусора.
+    """
+
+    def hashed_name(self, name, content):
+        digest = content_hash(content)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content).replace('\\', '/')
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content)
+        except FileExistsError:
+            # Тот же файл параллельно записал другой процесс.
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имён означает совпадение содержимого: вместо подбора
+        # нового имени _save прерывается, а save возвращает готовый файл.
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def delete(self, name):
+        """Не удаляет файл: им могут пользоваться другие записи."""
+
+    def purge(self, name):
+        """Удаляет файл с диска безусловно."""
+        super().delete(name)
+
+    def orphans(self, directory, referenced, grace_period=0):
+        """Перечисляет файлы каталога, на которые нет ссылок.
+
+        Файлы моложе ``grace_period`` секунд пропускаются: запись, которая
+        на них сошлётся, может быть ещё не сохранена.
+        """
+        deadline = time.time() - grace_period
+        root = self.path(directory)
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.location).replace('\\', '/')
+                if name in referenced:
+                    continue
+                if os.path.getmtime(path) > deadline:
+                    continue
+                yield name
@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.template import loader
+from django.template.base import TextNode
+from django.template.context import make_context
+from django.template.defaulttags import CsrfTokenNode, ForNode
+from django.template.loader_tags import (BLOCK_CONTEXT_KEY, BlockContext,
+                                         BlockNode, ExtendsNode)
+
+# Маркер, по которому накопленный буфер отправляется клиенту досрочно.
+FLUSH = object()
+
+
+def uses_csrf(template_name):
+    """Есть ли в шаблоне {% csrf_token %} (без учёта include)."""
+    template = loader.get_template(template_name).template
+    return bool(template.nodelist.get_nodes_by_type(CsrfTokenNode))
+
+
+def render_page(request, template_name, context=None):
+    """Рендерит страницу целиком или потоком — в зависимости от настроек.
+
+    {% csrf_token %} в потоке выполнился бы уже после CsrfViewMiddleware,
+    и cookie с токеном не ушла бы клиенту — первая отправка формы
+    получила бы 403. Поэтому для страниц с формой токен выдаётся заранее,
+    а анонимным посетителям, которым cookie лишняя (такие страницы
+    сохраняются на диск и склеиваются), они рендерятся целиком.
+    """
+    if not getattr(settings, 'STREAMING_RENDER', False):
+        return render(request, template_name, context)
+    if uses_csrf(template_name):
+        if not request.user.is_authenticated:
+            return render(request, template_name, context)
+        get_token(request)
+    return StreamingHttpResponse(
+        stream_template(request, template_name, context),
+        content_type='text/html; charset=utf-8',
+    )
+
+
+def stream_template(request, template_name, context=None):
+    """Отдаёт HTML шаблона частями по мере рендеринга.
+
+    Всё, что стоит до первого блока (head и шапка из base.html),
+    отправляется сразу, а циклы внутри блоков выдаются поэлементно.
+    """
+    chunk_size = getattr(settings, 'STREAMING_CHUNK_SIZE', 8192)
+    buffer = []
+    size = 0
+    for part in _iter_template(request, template_name, context):
+        if part is FLUSH:
+            if buffer:
+                yield ''.join(buffer)
+                buffer, size = [], 0
+            continue
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _iter_template(request, template_name, context):
+    template = loader.get_template(template_name).template
+    context = make_context(context, request,
+                           autoescape=template.engine.autoescape)
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            context.template_name = template.name
+            yield from _iter_nodelist(template.nodelist, context)
+
+
+def _iter_nodelist(nodelist, context):
+    for node in nodelist:
+        if isinstance(node, ExtendsNode):
+            yield from _iter_extends(node, context)
+        elif isinstance(node, BlockNode):
+            yield FLUSH
+            yield from _iter_block(node, context)
+        elif isinstance(node, ForNode) and _is_simple_loop(node):
+            yield from _iter_for(node, context)
+        else:
+            yield node.render_annotated(context)
+
+
+def _iter_extends(node, context):
+    # Повторяет ExtendsNode.render, но обходит родительский шаблон по узлам.
+    compiled_parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for parent_node in compiled_parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                block_context.add_blocks({
+                    block.name: block for block in
+                    compiled_parent.nodelist.get_nodes_by_type(BlockNode)
+                })
+            break
+    with context.render_context.push_state(compiled_parent,
+                                           isolated_context=False):
+        yield from _iter_nodelist(compiled_parent.nodelist, context)
+
+
+def _iter_block(node, context):
+    # Повторяет BlockNode.render с учётом переопределений из потомков.
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    with context.push():
+        if block_context is None:
+            context['block'] = node
+            yield from _iter_nodelist(node.nodelist, context)
+            return
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = type(node)(block.name, block.nodelist)
+        block.context = context
+        context['block'] = block
+        yield from _iter_nodelist(block.nodelist, context)
+        if push is not None:
+            block_context.push(node.name, push)
+
+
+def _is_simple_loop(node):
+    return not node.is_reversed and len(node.loopvars) == 1
+
+
+def _iter_for(node, context):
+    """Выдаёт тело цикла по одной итерации.
+
+    Невычисленный queryset читается через iterator() и не
+    материализуется в список: признак forloop.last вычисляется
+    заглядыванием на один элемент вперёд, а revcounter недоступен.
+    """
+    parentloop = context['forloop'] if 'forloop' in context else {}
+    with context.push():
+        values = node.sequence.resolve(context, ignore_failures=True)
+        if values is None:
+            values = []
+        if isinstance(values, QuerySet) and values._result_cache is None:
+            values = values.iterator()
+        length = len(values) if hasattr(values, '__len__') else None
+        iterator = iter(values)
+        sentinel = object()
+        item = next(iterator, sentinel)
+        if item is sentinel:
+            yield node.nodelist_empty.render(context)
+            return
+        loop_dict = context['forloop'] = {'parentloop': parentloop}
+        counter = 0
+        while item is not sentinel:
+            following = next(iterator, sentinel)
+            loop_dict['counter0'] = counter
+            loop_dict['counter'] = counter + 1
+            if length is not None:
+                loop_dict['revcounter'] = length - counter
+                loop_dict['revcounter0'] = length - counter - 1
+            loop_dict['first'] = counter == 0
+            loop_dict['last'] = following is sentinel
+            context[node.loopvars[0]] = item
+            yield ''.join(
+                loop_node.render_annotated(context)
+                for loop_node in node.nodelist_loop
+            )
+            item = following
+            counter += 1
@@ -0,0 +1,142 @@
+import json
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Avg, Count, F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Зарегистрированные задачи: полное имя функции -> функция.
+registry = {}
+
+RETRY_DELAY = 10
+VISIBILITY_TIMEOUT = 15 * 60
+
+_current = threading.local()
+
+
+def task(func=None, *, max_retries=3, retry_delay=RETRY_DELAY):
+    """Регистрирует функцию как фоновую задачу.
+
+    Вызов func.delay(*args, **kwargs) кладёт задачу в таблицу core_task
+    и сразу возвращает управление; аргументы должны сериализоваться
+    в JSON. При TASKS_EAGER задача выполняется на месте.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__name__}'
+        func.task_name = name
+        func.max_retries = max_retries
+        func.retry_delay = retry_delay
+        func.delay = lambda *args, **kwargs: enqueue(name, *args, **kwargs)
+        registry[name] = func
+        return func
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(name, *args, **kwargs):
+    func = registry[name]
+    if getattr(settings, 'TASKS_EAGER', False):
+        return func(*args, **kwargs)
+    return Task.objects.create(
+        name=name,
+        payload=json.dumps({'args': args, 'kwargs': kwargs}),
+        max_retries=func.max_retries,
+    )
+
+
+def claim_next():
+    """Забирает одну готовую задачу, не пересекаясь с другими воркерами."""
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.PENDING, run_at__lte=now).values_list('pk', flat=True)
+    for pk in candidates[:10]:
+        claimed = Task.objects.filter(pk=pk, status=Task.PENDING).update(
+            status=Task.RUNNING, started=now, attempts=F('attempts') + 1)
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def execute(task_obj):
+    func = registry.get(task_obj.name)
+    try:
+        if func is None:
+            raise LookupError(f'Задача {task_obj.name} не зарегистрирована')
+        payload = json.loads(task_obj.payload)
+        _current.task_id = task_obj.pk
+        func(*payload['args'], **payload['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Задача %s упала:\n%s', task_obj, error)
+        retry = func is not None and task_obj.attempts <= task_obj.max_retries
+        delay = (func.retry_delay if func else RETRY_DELAY) * 2 ** (
+            task_obj.attempts - 1)
+        Task.objects.filter(pk=task_obj.pk).update(
+            status=Task.PENDING if retry else Task.FAILED,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            finished=None if retry else timezone.now(),
+            last_error=error,
+        )
+        return False
+    finally:
+        _current.task_id = None
+    Task.objects.filter(pk=task_obj.pk).update(
+        status=Task.DONE, progress=100, finished=timezone.now(),
+        last_error='')
+    return True
+
+
+def report_progress(done, total):
+    """Сохраняет прогресс выполняемой задачи в процентах."""
+    task_id = getattr(_current, 'task_id', None)
+    if task_id is None or not total:
+        return
+    Task.objects.filter(pk=task_id).update(
+        progress=min(100, done * 100 // total))
+
+
+def run_pending(limit=None):
+    """Выполняет готовые задачи в текущем процессе. Возвращает их число."""
+    done = 0
+    while limit is None or done < limit:
+        task_obj = claim_next()
+        if task_obj is None:
+            break
+        execute(task_obj)
+        close_old_connections()
+        done += 1
+    return done
+
+
+def requeue_stale(timeout=VISIBILITY_TIMEOUT):
+    """Возвращает в очередь задачи, чей воркер умер во время выполнения."""
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    return Task.objects.filter(
+        status=Task.RUNNING, started__lt=deadline).update(status=Task.PENDING)
+
+
+def task_stats():
+    """Метрики очереди: число задач по статусам и среднее число попыток."""
+    stats = {}
+    rows = Task.objects.order_by().values('name', 'status').annotate(
+        count=Count('pk'), attempts=Avg('attempts'))
+    for row in rows:
+        stats.setdefault(row['name'], {})[row['status']] = {
+            'count': row['count'],
+            'avg_attempts': row['attempts'],
+        }
+    return stats
+
+
+def autodiscover():
+    autodiscover_modules('tasks')
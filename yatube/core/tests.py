@@ -0,0 +1,479 @@
+import gzip
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.utils import timezone
+
+from . import admission, querycache, ratelimit, tasks, versions
+from .cache import SharedFileCache
+from .fileserver import FileServer
+from .middleware import (COMPRESSIBLE_TYPES, AdmissionControlMiddleware,
+                         accepted_encoding)
+from .pubsub import Hub
+from .singleflight import SingleFlight, coalesce
+from .staticfiles import compress_variants
+from .models import Task
+
+calls = []
+
+
+@tasks.task(max_retries=1, retry_delay=0)
+def remember(value):
+    calls.append(value)
+
+
+@tasks.task(max_retries=1, retry_delay=0)
+def explode():
+    raise ValueError('boom')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_enqueues_and_worker_runs(self):
+        """delay() кладёт задачу в очередь, воркер её выполняет."""
+        remember.delay(42)
+        self.assertEqual(calls, [])
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(calls, [42])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_failed_task_is_retried_then_failed(self):
+        """Упавшая задача повторяется, а после лимита помечается ошибкой."""
+        explode.delay()
+        tasks.run_pending(limit=1)
+        task_obj = Task.objects.get()
+        self.assertEqual(task_obj.status, Task.PENDING)
+        self.assertIn('boom', task_obj.last_error)
+        Task.objects.update(run_at=timezone.now())
+        tasks.run_pending()
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.FAILED)
+        self.assertEqual(task_obj.attempts, 2)
+        stats = tasks.task_stats()[explode.task_name]
+        self.assertEqual(stats[Task.FAILED]['count'], 1)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        """При TASKS_EAGER задача выполняется сразу."""
+        remember.delay('now')
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Task.objects.exists())
+
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CSS = b'body { margin: 0; }\n' * 100
+HASHED_CSS = 'css/site.0123456789ab.css'
+
+
+def fallback(environ, start_response):
+    start_response('404 Not Found', [])
+    return [b'django']
+
+
+@override_settings(STATIC_ROOT=TEMP_STATIC_ROOT, MEDIA_ROOT=TEMP_STATIC_ROOT)
+class FileServerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        path = os.path.join(TEMP_STATIC_ROOT, HASHED_CSS)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as file:
+            file.write(CSS)
+        compress_variants(path)
+        cls.server = FileServer(fallback)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+
+    def get(self, path, **headers):
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+        environ.update(headers)
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, response_headers):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(response_headers)
+
+        body = b''.join(self.server(environ, start_response))
+        return response['status'], response['headers'], body
+
+    def test_hashed_static_is_immutable(self):
+        """Файл с хешем в имени кешируется навсегда."""
+        status, headers, body = self.get('/static/' + HASHED_CSS)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, CSS)
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(headers['Content-Type'], 'text/css')
+
+    def test_precompressed_variant(self):
+        """Клиенту с gzip отдаётся заранее сжатый вариант."""
+        status, headers, body = self.get(
+            '/static/' + HASHED_CSS, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), CSS)
+        self.assertEqual(int(headers['Content-Length']), len(body))
+
+    def test_not_modified(self):
+        """Совпавший ETag даёт 304 без тела."""
+        _, headers, _ = self.get('/static/' + HASHED_CSS)
+        status, _, body = self.get(
+            '/static/' + HASHED_CSS, HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+
+    def test_range_requests(self):
+        """Range отдаёт часть файла, а диапазон за концом — 416."""
+        status, headers, body = self.get(
+            '/static/' + HASHED_CSS, HTTP_RANGE='bytes=5-9')
+        self.assertEqual(status, 206)
+        self.assertEqual(body, CSS[5:10])
+        self.assertEqual(headers['Content-Range'], f'bytes 5-9/{len(CSS)}')
+        status, _, body = self.get('/static/' + HASHED_CSS,
+                                   HTTP_RANGE='bytes=-4')
+        self.assertEqual(body, CSS[-4:])
+        status, _, _ = self.get('/static/' + HASHED_CSS,
+                                HTTP_RANGE=f'bytes={len(CSS)}-')
+        self.assertEqual(status, 416)
+
+    def test_missing_and_outside_files_go_to_django(self):
+        """Отсутствующие файлы и выход за корень уходят в приложение."""
+        for path in ('/static/css/missing.css', '/media/../settings.py',
+                     '/static/../../manage.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path)[2], b'django')
+
+
+class CompressionMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+    def test_accept_encoding_negotiation(self):
+        """Кодировка выбирается с учётом q и запретов."""
+        self.assertEqual(accepted_encoding('gzip;q=0.5, identity'), 'gzip')
+        self.assertIsNone(accepted_encoding('gzip;q=0'))
+        self.assertIsNone(accepted_encoding('identity'))
+        self.assertIsNone(accepted_encoding(''))
+
+    def test_event_stream_is_not_compressed(self):
+        """События идут клиенту сразу, без буфера компрессора."""
+        self.assertTrue(COMPRESSIBLE_TYPES.match('text/html; charset=utf-8'))
+        self.assertIsNone(COMPRESSIBLE_TYPES.match('text/event-stream'))
+
+    def test_html_is_compressed(self):
+        """HTML-страница сжимается, повторный ответ совпадает побайтно."""
+        plain = Client().get('/about/author/')
+        response = self.client.get('/about/author/')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(
+            self.client.get('/about/author/').content, response.content)
+
+    @override_settings(STREAMING_RENDER=True)
+    def test_streaming_response_is_compressed(self):
+        """Потоковый ответ сжимается по частям и распаковывается целиком."""
+        plain = b''.join(Client().get('/').streaming_content)
+        response = self.client.get('/')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), plain)
+
+
+def increment(location, times):
+    counter = SharedFileCache(location, {})
+    for _ in range(times):
+        counter.add('hits', 0)
+        counter.incr('hits')
+
+
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        ratelimit.get_cache().clear()
+
+    def test_sliding_window(self):
+        """Предыдущее окно учитывается с убывающим весом."""
+        for _ in range(10):
+            self.assertEqual(ratelimit.hit('test', 'ip:1', 10, 60, 59), 0)
+        self.assertEqual(ratelimit.hit('test', 'ip:1', 10, 60, 59), 1)
+        # В начале следующего окна почти все 11 запросов ещё на счету.
+        self.assertGreater(ratelimit.hit('test', 'ip:1', 10, 60, 61), 0)
+        # К середине окна вес предыдущего упал вдвое.
+        self.assertEqual(ratelimit.hit('test', 'ip:1', 10, 60, 90), 0)
+
+    def test_shared_counter_is_atomic_across_processes(self):
+        """Инкременты из разных процессов не теряются."""
+        location = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        workers = [
+            multiprocessing.Process(target=increment, args=(location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(SharedFileCache(location, {}).get('hits'), 200)
+
+
+class SharedFileCacheTests(SimpleTestCase):
+    def test_expired_entries_are_culled_before_live_ones(self):
+        location = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        cache = SharedFileCache(location, {'OPTIONS': {
+            'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 1}})
+        for number in range(3):
+            cache.set(f'old{number}', number, 0.01)
+        cache.set('live', 'окно', 60)
+        time.sleep(0.02)
+        cache._next_cull_check = 0
+        cache.set('new', 'окно', 60)
+        self.assertEqual(cache.get_many(['live', 'new']),
+                         {'live': 'окно', 'new': 'окно'})
+
+    def test_incr_keeps_expiry(self):
+        """Инкремент не сокращает срок жизни счётчика."""
+        location = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        cache = SharedFileCache(location, {})
+
+        def expiry(key):
+            with open(cache._key_to_file(key), 'rb') as file:
+                return pickle.load(file)
+
+        cache.add('hour', 0, 7200)
+        cache.add('forever', 0, None)
+        self.assertEqual(cache.incr('hour'), 1)
+        self.assertEqual(cache.incr('forever', 5), 5)
+        self.assertGreater(expiry('hour'), time.time() + 7000)
+        self.assertIsNone(expiry('forever'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='cached', password='old-password')
+        self.client.force_login(self.user)
+
+    def test_logged_in_request_skips_session_and_user_queries(self):
+        """Повторный запрос вошедшего пользователя не обращается к БД."""
+        self.client.get('/about/author/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/about/author/')
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_password_change_ends_cached_sessions(self):
+        """После смены пароля закешированный пользователь не используется."""
+        self.client.get('/about/author/')
+        self.user.set_password('new-password')
+        self.user.save()
+        response = self.client.get('/about/author/')
+        self.assertFalse(response.context['user'].is_authenticated)
+
+
+@override_settings(QUERYCACHE_STATS_SAMPLE=1)
+class QueryCacheTests(TransactionTestCase):
+    def setUp(self):
+        querycache.get_cache().clear()
+        self.user = get_user_model().objects.create_user(username='reader')
+
+    def lookup(self):
+        return querycache.cached(get_user_model()).get(username='reader')
+
+    def test_repeated_lookup_is_served_from_cache(self):
+        """Повторный запрос не доходит до БД, пока таблица не менялась."""
+        readers = querycache.cached(get_user_model()).filter(
+            username='reader')
+        with self.assertNumQueries(2):
+            self.lookup()
+            readers.exists()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup(), self.user)
+            self.assertTrue(readers.exists())
+        stats = querycache.stats()[get_user_model()._meta.label]
+        self.assertGreaterEqual(stats['hit'], 1)
+
+    def test_any_write_to_table_invalidates(self):
+        """update() и сырой SQL сбрасывают кеш таблицы."""
+        self.lookup()
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            first_name='Иван')
+        self.assertEqual(self.lookup().first_name, 'Иван')
+        table = get_user_model()._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE "{table}" SET first_name = %s', ['Пётр'])
+        self.assertEqual(self.lookup().first_name, 'Пётр')
+
+    def test_lost_version_does_not_revive_stale_results(self):
+        """Пропавшая версия таблицы не совпадает с прежней."""
+        self.lookup()
+        table = get_user_model()._meta.db_table
+        before = querycache.table_versions([table])
+        versions.get_cache().clear()
+        self.assertNotEqual(querycache.table_versions([table]), before)
+
+
+builds = []
+
+
+@coalesce
+def slow_page(request):
+    builds.append(request.path)
+    time.sleep(0.2)
+    return HttpResponse('страница')
+
+
+@override_settings(SINGLEFLIGHT_CACHE=None)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        builds.clear()
+        self.factory = RequestFactory()
+
+    def fetch_concurrently(self, count, **cookies):
+        responses = []
+
+        def fetch():
+            request = self.factory.get('/popular/')
+            request.COOKIES.update(cookies)
+            responses.append(slow_page(request))
+
+        threads = [threading.Thread(target=fetch) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_concurrent_anonymous_requests_share_one_build(self):
+        """Одновременные одинаковые запросы ждут одну сборку страницы."""
+        responses = self.fetch_concurrently(8)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(
+            {response.content.decode() for response in responses},
+            {'страница'})
+
+    def test_requests_with_session_are_not_shared(self):
+        """Запросы с сессией строятся каждый отдельно."""
+        self.fetch_concurrently(3, **{settings.SESSION_COOKIE_NAME: 'abc'})
+        self.assertEqual(len(builds), 3)
+
+    def test_other_process_waits_for_result_in_shared_cache(self):
+        """Через общий кеш результат ведущего получает и другой процесс."""
+        cache.clear()
+        leader, other = SingleFlight(), SingleFlight()
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'результат'
+
+        thread = threading.Thread(
+            target=leader.do, args=('key', build, cache))
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(other.do('key', build, cache), 'результат')
+        thread.join()
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(ADMISSION_LIMITS={'read': 2, 'write': 1, 'admin': 1},
+                   ADMISSION_QUEUE_TIMEOUT={'read': 0, 'write': 0},
+                   ADMISSION_DEGRADED_AT=0.5)
+class AdmissionControlTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        admission.stale_cache().clear()
+        self.addCleanup(setattr, admission, 'state', admission.state)
+        admission.state = admission.LoadState()
+        self.release = threading.Event()
+        self.factory = RequestFactory()
+
+        def view(request):
+            if request.GET.get('hold'):
+                self.release.wait(5)
+            return HttpResponse(f'страница {request.path}')
+
+        self.middleware = AdmissionControlMiddleware(view)
+
+    def hold(self, request):
+        thread = threading.Thread(target=self.middleware, args=(request,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.release.set)
+        while not admission.state.in_flight.get(
+                admission.request_kind(request)):
+            time.sleep(0.01)
+
+    def test_write_over_limit_is_shed(self):
+        """Запрос сверх лимита класса получает 503 с Retry-After."""
+        self.hold(self.factory.post('/create/?hold=1'))
+        response = self.middleware(self.factory.post('/create/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(admission.metrics()['shed']['write'], 1)
+
+    def test_degraded_mode_serves_stale_pages(self):
+        """Под нагрузкой чтения отдаются из сохранённой копии."""
+        self.middleware(self.factory.get('/group/test/'))
+        self.hold(self.factory.get('/posts/1/?hold=1'))
+        response = self.middleware(self.factory.get('/group/test/'))
+        self.assertEqual(response['X-Load-Mode'], 'degraded')
+        self.assertEqual(response.content.decode(), 'страница /group/test/')
+        admin = self.middleware(self.factory.get('/admin/'))
+        self.assertEqual(admin.status_code, 503)
+        metrics = admission.metrics()
+        self.assertEqual(metrics['mode'], 'degraded')
+        self.assertEqual(metrics['events']['stale'], 1)
+
+    def test_stale_copies_only_for_listed_pages(self):
+        """Копии не сохраняются для чужих адресов и лишних параметров."""
+        for path in ('/group/test/?x=1', '/group/test/?page=x',
+                     '/about/author/', '/no-such-page/'):
+            request = self.factory.get(path)
+            self.assertIsNone(admission.stale_key(request))
+        request = self.factory.get('/group/test/?page=2')
+        self.middleware(request)
+        self.assertIsNotNone(
+            admission.stale_cache().get(admission.stale_key(request)))
+
+
+class HubTests(SimpleTestCase):
+    def test_message_reaches_each_subscriber_once(self):
+        """Подписчик нескольких каналов получает сообщение один раз."""
+        hub = Hub()
+        both = hub.subscribe(['a', 'b'])
+        other = hub.subscribe(['c'])
+        self.assertEqual(hub.publish(['a', 'b'], 1), 1)
+        self.assertEqual(both.get(0), [1])
+        self.assertEqual(other.get(0), [])
+        hub.unsubscribe(both)
+        self.assertEqual(hub.publish(['a'], 2), 0)
+        self.assertEqual(hub.subscribers(), 1)
+
+    def test_waiting_subscriber_wakes_on_publish(self):
+        hub = Hub()
+        subscription = hub.subscribe(['a'])
+        threading.Timer(0.05, hub.publish, (['a'], 'новое')).start()
+        self.assertEqual(subscription.get(5), ['новое'])
@@ -0,0 +1,65 @@
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, 'VERSIONS_CACHE', 'default')]
+
+
+def new_token():
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def locked(cache):
+    """Межпроцессная блокировка у SharedFileCache, иначе — процесса."""
+    lock = cache.lock() if hasattr(cache, 'lock') else _lock
+    with lock:
+        yield
+
+
+def get_many(keys):
+    """Текущие версии ключей; недостающие создаются.
+
+    Версия — случайная строка, а не счётчик: если запись пропала из
+    кеша, новая версия не совпадёт ни с одной прежней, и устаревшие
+    данные не станут снова свежими.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = new_token()
+            if not cache.add(key, token, None):
+                token = cache.get(key, token)
+            versions[key] = token
+    return versions
+
+
+def get(key):
+    return get_many([key])[key]
+
+
+def bump(key):
+    """Новая версия ключа; set() файлового кеша атомарен и без блокировки."""
+    token = new_token()
+    get_cache().set(key, token, None)
+    return token
+
+
+def replace(key, expected):
+    """Меняет версию и возвращает новую, если прежней была ``expected``.
+
+    Иначе — None: версию успел сменить кто-то ещё.
+    """
+    cache = get_cache()
+    with locked(cache):
+        current = cache.get(key)
+        token = bump(key)
+    return token if current == expected else None
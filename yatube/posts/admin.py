@@ -1,9 +1,56 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Q
 
-from .models import Group, Post
+from .models import Comment, Follow, Group, Post, User
+from .tasks import delete_comments, delete_posts, move_posts, purge_authors
+from .utils import EstimatedCountPaginator
 
+# Длиннее id не бывает: SQLite и PostgreSQL хранят их в 64 битах.
+MAX_ID_DIGITS = 18
 
-class PostAdmin(admin.ModelAdmin):
+
+class ModerationActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        label='Группа',
+        required=False,
+    )
+
+
+class BackgroundModerationMixin:
+    """Массовые действия ставятся в очередь фоновых задач.
+
+    Стандартное удаление загружает все объекты в запросе, поэтому
+    оно отключено в пользу пакетного удаления воркером.
+    """
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def enqueue(self, request, job, *args):
+        queued = job.delay(*args)
+        if queued is None:
+            self.message_user(request, 'Готово.')
+            return
+        self.message_user(
+            request,
+            f'Задача №{queued.pk} поставлена в очередь, '
+            f'прогресс — в разделе «Фоновые задачи».',
+            messages.INFO,
+        )
+
+    def purge_authors(self, request, queryset):
+        author_ids = sorted(set(
+            queryset.order_by().values_list('author_id', flat=True)))
+        self.enqueue(request, purge_authors, author_ids)
+    purge_authors.short_description = (
+        'Удалить весь контент авторов выбранных записей')
+
+
+class PostAdmin(BackgroundModerationMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,10 +59,92 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    paginator = EstimatedCountPaginator
+    list_per_page = 50
+    show_full_result_count = False
+    action_form = ModerationActionForm
+    actions = ('delete_in_background', 'move_to_group', 'purge_authors')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # К поиску по тексту добавляются совпадения по индексам: точное
+        # имя автора или слаг группы, а для числа — и id поста.
+        results, use_distinct = super().get_search_results(
+            request, queryset, search_term)
+        term = search_term.strip()
+        if not term:
+            return results, use_distinct
+        indexed = (Q(author__in=User.objects.filter(username=term))
+                   | Q(group__in=Group.objects.filter(slug=term)))
+        if term.isascii() and term.isdigit() and len(term) <= MAX_ID_DIGITS:
+            indexed |= Q(pk=int(term))
+        return results | queryset.filter(indexed), use_distinct
+
+    def delete_in_background(self, request, queryset):
+        post_ids = list(queryset.values_list('pk', flat=True))
+        self.enqueue(request, delete_posts, post_ids)
+    delete_in_background.short_description = 'Удалить выбранные записи'
+
+    def move_to_group(self, request, queryset):
+        try:
+            group = self.action_form.base_fields['group'].clean(
+                request.POST.get('group'))
+        except forms.ValidationError as error:
+            self.message_user(request, ' '.join(error.messages),
+                              messages.ERROR)
+            return
+        post_ids = list(queryset.values_list('pk', flat=True))
+        self.enqueue(request, move_posts, post_ids,
+                     group.pk if group else None)
+    move_to_group.short_description = 'Перенести выбранные записи в группу'
+
+
+class GroupAdmin(admin.ModelAdmin):
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(BackgroundModerationMixin, admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'text',
+        'created',
+        'author',
+        'post',
+    )
+    list_select_related = ('author',)
+    search_fields = ('=author__username',)
+    raw_id_fields = ('author', 'post')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('delete_in_background', 'purge_authors')
+    empty_value_display = '-пусто-'
+
+    def delete_in_background(self, request, queryset):
+        comment_ids = list(queryset.values_list('pk', flat=True))
+        self.enqueue(request, delete_comments, comment_ids)
+    delete_in_background.short_description = 'Удалить выбранные комментарии'
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'user',
+        'author',
+    )
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    raw_id_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
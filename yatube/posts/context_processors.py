@@ -0,0 +1,18 @@
+from django.conf import settings
+
+from . import unread
+
+
+def unread_count(request):
+    """Число новых постов в ленте подписок для значка в шапке.
+
+    Считается только если шаблон его выводит.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_count': lambda: unread.unread_count(request.user.id)}
+
+
+def live_updates(request):
+    """Включены ли Server-Sent Events о новых постах (LIVE_UPDATES)."""
+    return {'live_updates': settings.LIVE_UPDATES}
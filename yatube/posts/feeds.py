@@ -0,0 +1,146 @@
+import hashlib
+from functools import wraps
+
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import parse_http_date_safe, quote_etag
+
+from core import querycache
+from core.singleflight import freeze_response, thaw_response
+
+from .models import Group, Post, User
+
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 24 * 3600
+# Поля постов, которые выводит лента: от них и зависит её кеш.
+FEED_FIELDS = ('pk', 'text', 'pub_date', 'author__username',
+               'author__first_name', 'author__last_name')
+
+
+def conditional(view, tables=(Post,), signature=None,
+                timeout=FEED_CACHE_TIMEOUT):
+    """Кеширует ответ view, пока не изменились его данные, и отвечает 304.
+
+    Ключ кеша — адрес запроса и то, что возвращает
+    ``signature(request, *args, **kwargs)``, а без неё — версии таблиц
+    ``tables`` из core.querycache. ETag от содержимого ответа позволяет
+    читателям лент не скачивать его повторно.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if signature is not None:
+            data = signature(request, *args, **kwargs)
+        else:
+            data = querycache.table_versions(
+                model._meta.db_table for model in tables)
+        key = 'feeds:' + hashlib.sha1(
+            (request.build_absolute_uri() + repr(data)).encode()).hexdigest()
+        cache = querycache.get_cache()
+        frozen = cache.get(key)
+        if frozen is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response['ETag'] = quote_etag(
+                hashlib.sha1(response.content).hexdigest())
+            frozen = freeze_response(response)
+            if frozen is None:
+                return response
+            cache.set(key, frozen, timeout)
+        response = thaw_response(frozen)
+        return get_conditional_response(
+            request, etag=response['ETag'],
+            last_modified=parse_http_date_safe(
+                response.get('Last-Modified', '')),
+            response=response)
+    return wrapper
+
+
+class PostFeed(Feed):
+    """Atom-лента последних постов сайта."""
+    feed_type = Atom1Feed
+    title = 'Yatube: последние записи'
+    subtitle = 'Последние обновления на сайте'
+
+    def __call__(self, request, *args, **kwargs):
+        return conditional(super().__call__, signature=self.signature)(
+            request, *args, **kwargs)
+
+    def signature(self, request, *args, **kwargs):
+        """Заголовок ленты и выводимые поля её постов.
+
+        Не версии таблиц: posts_post меняется с каждым комментарием
+        (счёт популярности), а auth_user — с каждым входом на сайт.
+        """
+        obj = self.get_object(request, *args, **kwargs)
+        header = [getattr(self, name) for name in ('title', 'subtitle')]
+        header = [value(obj) if callable(value) else value
+                  for value in header]
+        return header, list(self.posts(obj).values_list(
+            *FEED_FIELDS)[:FEED_ITEMS])
+
+    def link(self, obj=None):
+        return reverse('posts:index')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj=None):
+        return self.posts(obj).select_related(
+            'author', 'group')[:FEED_ITEMS]
+
+    def item_title(self, item):
+        return item.text[:50]
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=(item.pk,))
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+
+class GroupFeed(PostFeed):
+    """Atom-лента сообщества."""
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group.objects.cached(), slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: записи сообщества {obj}'
+
+    def subtitle(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('posts:group_list', args=(obj.slug,))
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class AuthorFeed(PostFeed):
+    """Atom-лента автора."""
+
+    def get_object(self, request, username):
+        return get_object_or_404(querycache.cached(User), username=username)
+
+    def title(self, obj):
+        return f'Yatube: записи {obj.get_full_name() or obj.username}'
+
+    def subtitle(self, obj):
+        return f'Записи пользователя {obj.username}'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=(obj.username,))
+
+    def posts(self, obj):
+        return obj.posts.all()
@@ -0,0 +1,343 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import versions
+
+from . import unread
+from .models import Follow, FollowCounter
+
+GRAPH_VERSION_KEY = 'follow_graph:version'
+PAGE_SIZE = 20
+BULK_BATCH_SIZE = 500
+
+
+class FollowGraph:
+    """Граф подписок в памяти процесса.
+
+    Для каждого пользователя хранятся отсортированные массивы id авторов,
+    на которых он подписан, и id его подписчиков. Изменения в этом процессе
+    применяются точечно после коммита, а изменения из других процессов
+    замечаются по версии графа в общем кеше core.versions и приводят
+    к перестроению.
+    Внутри транзакции из БД читаются только строки нужных пользователей:
+    в кэш процесса не должны попасть данные, которые ещё могут откатиться.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._following = {}
+        self._followers = {}
+        self._version = None
+
+    def load(self, user_ids=None, author_ids=None):
+        """Весь граф или только подписки user_ids и подписчики author_ids."""
+        edges = Follow.objects.order_by('user_id', 'author_id')
+        partial = user_ids is not None or author_ids is not None
+        if partial:
+            user_ids, author_ids = set(user_ids or ()), set(author_ids or ())
+            edges = edges.filter(Q(user_id__in=user_ids)
+                                 | Q(author_id__in=author_ids))
+        following, followers = {}, {}
+        for user_id, author_id in edges.values_list(
+                'user_id', 'author_id').iterator():
+            if not partial or user_id in user_ids:
+                following.setdefault(user_id, array('l')).append(author_id)
+            if not partial or author_id in author_ids:
+                followers.setdefault(author_id, []).append(user_id)
+        followers = {
+            author_id: array('l', sorted(ids))
+            for author_id, ids in followers.items()
+        }
+        return following, followers
+
+    def _snapshot(self, user_ids=(), author_ids=()):
+        if connection.in_atomic_block:
+            return self.load(user_ids, author_ids)
+        with self._lock:
+            version = versions.get(GRAPH_VERSION_KEY)
+            if version != self._version:
+                self._following, self._followers = self.load()
+                self._version = version
+            return self._following, self._followers
+
+    def _apply(self, change):
+        def apply():
+            with self._lock:
+                expected = self._version
+                change()
+                # Если версию успел сменить другой процесс, его изменений
+                # у нас нет — при следующем чтении граф перестроится.
+                if expected is None:
+                    versions.bump(GRAPH_VERSION_KEY)
+                else:
+                    self._version = versions.replace(
+                        GRAPH_VERSION_KEY, expected)
+        transaction.on_commit(apply)
+
+    def reset(self):
+        """Перестроить граф во всех процессах после массовых изменений."""
+        def apply():
+            with self._lock:
+                versions.bump(GRAPH_VERSION_KEY)
+                self._version = None
+        transaction.on_commit(apply)
+
+    def add(self, user_id, author_id):
+        def change():
+            _insert(self._following, user_id, author_id)
+            _insert(self._followers, author_id, user_id)
+        self._apply(change)
+
+    def remove(self, user_id, author_id):
+        def change():
+            _discard(self._following, user_id, author_id)
+            _discard(self._followers, author_id, user_id)
+        self._apply(change)
+
+    def follows(self, user_id, author_id):
+        following, _ = self._snapshot(user_ids=[user_id])
+        return _contains(following.get(user_id), author_id)
+
+    def followed_among(self, user_id, author_ids):
+        """Какие из переданных авторов есть в подписках пользователя."""
+        following, _ = self._snapshot(user_ids=[user_id])
+        ids = following.get(user_id)
+        return {
+            author_id for author_id in author_ids
+            if _contains(ids, author_id)
+        }
+
+    def following(self, user_id, after=None, limit=PAGE_SIZE):
+        following, _ = self._snapshot(user_ids=[user_id])
+        return _page(following.get(user_id), after, limit)
+
+    def followers(self, user_id, after=None, limit=PAGE_SIZE):
+        _, followers = self._snapshot(author_ids=[user_id])
+        return _page(followers.get(user_id), after, limit)
+
+    def suggestions(self, user_id, limit=5):
+        """Кого почитать: авторы, на которых подписаны мои подписки.
+
+        Чем больше моих подписок читают автора, тем выше он в списке;
+        при равенстве выигрывает автор с большим числом подписчиков.
+        """
+        following, followers = self._snapshot(user_ids=[user_id])
+        mine = following.get(user_id, ())
+        if connection.in_atomic_block:
+            following, _ = self.load(user_ids=mine)
+        candidates = Counter()
+        for author_id in mine:
+            candidates.update(following.get(author_id, ()))
+        candidates.pop(user_id, None)
+        for author_id in mine:
+            candidates.pop(author_id, None)
+        if connection.in_atomic_block:
+            popularity = dict(FollowCounter.objects.filter(
+                pk__in=candidates).values_list('pk', 'followers'))
+        else:
+            popularity = {author_id: len(followers.get(author_id, ()))
+                          for author_id in candidates}
+        ranked = sorted(
+            candidates.items(),
+            key=lambda item: (-item[1], -popularity.get(item[0], 0),
+                              item[0]))
+        return [author_id for author_id, _ in ranked[:limit]]
+
+
+def _contains(ids, value):
+    if not ids:
+        return False
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+def _insert(adjacency, key, value):
+    ids = adjacency.setdefault(key, array('l'))
+    if not _contains(ids, value):
+        insort(ids, value)
+
+
+def _discard(adjacency, key, value):
+    ids = adjacency.get(key)
+    if _contains(ids, value):
+        del ids[bisect_left(ids, value)]
+
+
+def _page(ids, after, limit):
+    """Страница id по курсору: следующий курсор — последний отданный id."""
+    if not ids:
+        return [], None
+    start = 0 if after is None else bisect_right(ids, after)
+    page = ids[start:start + limit].tolist()
+    has_more = start + limit < len(ids)
+    return page, page[-1] if has_more and page else None
+
+
+graph = FollowGraph()
+
+
+def _follow_sql():
+    qn = connection.ops.quote_name
+    return (
+        f'INSERT INTO {qn(Follow._meta.db_table)} '
+        f'({qn("user_id")}, {qn("author_id")}) VALUES (%s, %s) '
+        f'ON CONFLICT DO NOTHING'
+    )
+
+
+def _unfollow_sql(authors_count=1):
+    qn = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * authors_count)
+    return (
+        f'DELETE FROM {qn(Follow._meta.db_table)} '
+        f'WHERE {qn("user_id")} = %s AND {qn("author_id")} IN ({placeholders})'
+    )
+
+
+def _remove_followers_sql(authors_count):
+    qn = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * authors_count)
+    return (
+        f'DELETE FROM {qn(Follow._meta.db_table)} '
+        f'WHERE {qn("author_id")} IN ({placeholders})'
+    )
+
+
+def _counter_sql():
+    qn = connection.ops.quote_name
+    table = qn(FollowCounter._meta.db_table)
+    return (
+        f'INSERT INTO {table} ({qn("user_id")}, {qn("followers")}, '
+        f'{qn("following")}) VALUES (%s, %s, %s) '
+        f'ON CONFLICT ({qn("user_id")}) DO UPDATE SET '
+        f'{qn("followers")} = {table}.{qn("followers")} '
+        f'+ excluded.{qn("followers")}, '
+        f'{qn("following")} = {table}.{qn("following")} '
+        f'+ excluded.{qn("following")}'
+    )
+
+
+def _increment_counters(user_id, author_id):
+    with connection.cursor() as cursor:
+        cursor.executemany(_counter_sql(), [
+            (user_id, 0, 1),
+            (author_id, 1, 0),
+        ])
+
+
+def _decrement_counters(user_id, author_id):
+    FollowCounter.objects.filter(pk=user_id, following__gt=0).update(
+        following=F('following') - 1)
+    FollowCounter.objects.filter(pk=author_id, followers__gt=0).update(
+        followers=F('followers') - 1)
+
+
+def follow(user, author):
+    """Подписывает user на author одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Повторный вызов ничего не меняет. Счётчики и граф обновляются в той же
+    транзакции, только если строка действительно появилась.
+    """
+    if user.pk == author.pk:
+        return False
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(_follow_sql(), [user.pk, author.pk])
+            created = cursor.rowcount == 1
+        if created:
+            _increment_counters(user.pk, author.pk)
+            graph.add(user.pk, author.pk)
+            unread.recount(user.pk)
+    return created
+
+
+def unfollow(user, author):
+    """Отписывает user от author одним DELETE; повтор — не ошибка."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(_unfollow_sql(), [user.pk, author.pk])
+            deleted = cursor.rowcount == 1
+        if deleted:
+            _decrement_counters(user.pk, author.pk)
+            graph.remove(user.pk, author.pk)
+            unread.recount(user.pk)
+    return deleted
+
+
+def recount(user_ids):
+    """Пересчитывает счётчики подписок пользователей по таблице Follow."""
+    user_ids = set(user_ids)
+    counters = {pk: FollowCounter(user_id=pk) for pk in user_ids}
+    for field, counter_field in (('author', 'followers'),
+                                 ('user', 'following')):
+        rows = Follow.objects.filter(**{f'{field}__in': user_ids}).order_by(
+        ).values(field).annotate(total=Count('pk'))
+        for row in rows:
+            setattr(counters[row[field]], counter_field, row['total'])
+    with transaction.atomic():
+        FollowCounter.objects.filter(pk__in=user_ids).delete()
+        FollowCounter.objects.bulk_create(
+            counters.values(), batch_size=BULK_BATCH_SIZE)
+
+
+def bulk_follow(user, author_ids):
+    """Массовая подписка, например при импорте графа из другой сети."""
+    author_ids = set(author_ids) - {user.pk}
+    with transaction.atomic():
+        Follow.objects.bulk_create(
+            [Follow(user_id=user.pk, author_id=pk) for pk in author_ids],
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        recount(author_ids | {user.pk})
+        graph.reset()
+        unread.recount(user.pk)
+
+
+def bulk_unfollow(user, author_ids):
+    author_ids = list(set(author_ids))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for start in range(0, len(author_ids), BULK_BATCH_SIZE):
+                batch = author_ids[start:start + BULK_BATCH_SIZE]
+                cursor.execute(_unfollow_sql(len(batch)), [user.pk, *batch])
+        recount(set(author_ids) | {user.pk})
+        graph.reset()
+        unread.recount(user.pk)
+
+
+def remove_followers(author_ids):
+    """Отписывает от авторов всех их подписчиков, например от спамеров."""
+    author_ids = list(set(author_ids))
+    with transaction.atomic():
+        user_ids = set(Follow.objects.filter(
+            author_id__in=author_ids).values_list('user_id', flat=True))
+        with connection.cursor() as cursor:
+            for start in range(0, len(author_ids), BULK_BATCH_SIZE):
+                batch = author_ids[start:start + BULK_BATCH_SIZE]
+                cursor.execute(_remove_followers_sql(len(batch)), batch)
+        recount(user_ids | set(author_ids))
+        graph.reset()
+        for user_id in user_ids:
+            unread.recount(user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        _increment_counters(instance.user_id, instance.author_id)
+        graph.add(instance.user_id, instance.author_id)
+        unread.recount(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    _decrement_counters(instance.user_id, instance.author_id)
+    graph.remove(instance.user_id, instance.author_id)
+    unread.recount(instance.user_id)
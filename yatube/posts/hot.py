@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Comment, HotEpoch, Post
+
+# За это время вклад события в популярность уменьшается вдвое.
+HALF_LIFE = 6 * 3600
+POST_WEIGHT = 3.0
+COMMENT_WEIGHT = 1.0
+# Ниже этого значения пост в ленте обсуждаемого уже ничего не весит.
+MIN_SCORE = 1e-3
+# Дальше стольких периодов полураспада от точки отсчёта события её
+# переносят: 2 ** 1024 уже не помещается во float.
+MAX_HALF_LIVES = 512
+
+
+def half_lives(at, epoch):
+    return (at - epoch).total_seconds() / HALF_LIFE
+
+
+def weight(amount, at, epoch):
+    """Вклад события в момент ``at`` в счёте, приведённом к ``epoch``.
+
+    Вместо того чтобы уменьшать счёт всех постов с течением времени,
+    каждое новое событие весит тем больше, чем оно позже: порядок
+    постов получается тем же, что и при честном затухании, а обновление
+    счёта — одним UPDATE с прибавлением. Показатель ограничен, чтобы
+    вычисление не падало с OverflowError.
+    """
+    return amount * 2 ** min(half_lives(at, epoch), 2 * MAX_HALF_LIVES)
+
+
+def current_epoch():
+    epoch = HotEpoch.objects.filter(pk=1).values_list(
+        'started', flat=True).first()
+    if epoch is None:
+        epoch = HotEpoch.objects.get_or_create(
+            pk=1, defaults={'started': timezone.now()})[0].started
+    return epoch
+
+
+def epoch_for(at):
+    """Точка отсчёта для события в ``at``; слишком старая переносится.
+
+    Так счёт не переполняется, даже если decay_hot_scores никто
+    не запускает по расписанию.
+    """
+    epoch = current_epoch()
+    if half_lives(at, epoch) > MAX_HALF_LIVES:
+        decay(at)
+        epoch = current_epoch()
+    return epoch
+
+
+def add_activity(post_id, amount, at):
+    Post.objects.filter(pk=post_id).update(
+        hot_score=F('hot_score') + weight(amount, at, epoch_for(at)),
+        last_activity=at,
+    )
+
+
+def decay(now=None):
+    """Переносит точку отсчёта на ``now`` и уменьшает все счета.
+
+    Порядок постов от этого не меняется; перенос не даёт значениям
+    расти без ограничений и обнуляет счёт давно остывших постов,
+    чтобы они не попадали в ленту обсуждаемого.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        epoch = current_epoch()
+        factor = 1 / weight(1, now, epoch)
+        # Отсчёт, уже перенесённый другим процессом, второй раз не
+        # переносится, иначе счета уменьшились бы дважды.
+        if not HotEpoch.objects.filter(pk=1, started=epoch).update(
+                started=now):
+            return 0
+        Post.objects.filter(hot_score__gt=0).update(
+            hot_score=F('hot_score') * factor)
+        return Post.objects.filter(
+            hot_score__gt=0, hot_score__lt=MIN_SCORE).update(hot_score=0)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        score = weight(POST_WEIGHT, instance.pub_date,
+                       epoch_for(instance.pub_date))
+        Post.objects.filter(pk=instance.pk).update(
+            hot_score=score, last_activity=instance.pub_date)
+        instance.hot_score = score
+        instance.last_activity = instance.pub_date
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        add_activity(instance.post_id, COMMENT_WEIGHT, instance.created)
@@ -0,0 +1,151 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.pubsub import Hub
+
+from .models import Follow, Post
+
+HEARTBEAT = 15
+MAX_DURATION = 300
+POLL_INTERVAL = 1
+POLL_BATCH = 500
+# Больше стольких новых постов при подключении не считается.
+MAX_INITIAL = 100
+# Через столько миллисекунд EventSource переподключается.
+RETRY_MS = 3000
+# Столько последних опубликованных постов помнится, чтобы пост из своего
+# процесса не пришёл подписчикам второй раз от опроса БД.
+RECENT = 1000
+
+logger = logging.getLogger(__name__)
+
+hub = Hub()
+_recent = deque(maxlen=RECENT)
+_recent_lock = threading.Lock()
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def channels_for(author_id, group_id):
+    channels = ['posts', f'author:{author_id}']
+    if group_id:
+        channels.append(f'group:{group_id}')
+    return channels
+
+
+def publish(post_id, author_id, group_id):
+    with _recent_lock:
+        if post_id in _recent:
+            return 0
+        _recent.append(post_id)
+    return hub.publish(channels_for(author_id, group_id), post_id)
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish(
+            instance.pk, instance.author_id, instance.group_id))
+
+
+class PostPoller(threading.Thread):
+    """Замена межпроцессной шины: опрос таблицы постов по первичному ключу.
+
+    Один поток на процесс раз в LIVE_POLL_INTERVAL секунд читает посты
+    новее последнего увиденного (поиск по индексу, пустой почти всегда)
+    и публикует их в hub, если у процесса есть подписчики. Так о постах
+    из других процессов подписчики узнают с задержкой не больше интервала.
+    """
+    daemon = True
+
+    def __init__(self, interval):
+        super().__init__(name='live-post-poller')
+        self.interval = interval
+        self.last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    def poll(self):
+        rows = list(Post.objects.filter(pk__gt=self.last_pk).order_by(
+            'pk').values_list('pk', 'author_id', 'group_id')[:POLL_BATCH])
+        for row in rows:
+            publish(*row)
+        if rows:
+            self.last_pk = rows[-1][0]
+        return len(rows)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            if not hub.subscribers():
+                continue
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Не удалось прочитать новые посты')
+            finally:
+                close_old_connections()
+
+
+def start_poller():
+    global _poller
+    interval = getattr(settings, 'LIVE_POLL_INTERVAL', POLL_INTERVAL)
+    if not interval or _poller is not None:
+        return
+    with _poller_lock:
+        if _poller is None:
+            _poller = PostPoller(interval)
+            _poller.start()
+
+
+def scope(group=None, user=None):
+    """Каналы и посты области: весь сайт, сообщество или подписки."""
+    if group is not None:
+        return [f'group:{group.pk}'], Post.objects.filter(group=group)
+    if user is not None:
+        authors = Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True)
+        return ([f'author:{pk}' for pk in authors],
+                Post.objects.filter(author_id__in=authors))
+    return ['posts'], Post.objects.all()
+
+
+def event(count, last=None):
+    data = json.dumps({'new': count, 'last': last})
+    return f'event: posts\ndata: {data}\n\n'
+
+
+def stream(channels, initial=0):
+    """Поток Server-Sent Events «N новых постов» для каналов.
+
+    Счётчик накопительный с момента загрузки страницы. Раз в
+    LIVE_HEARTBEAT секунд уходит комментарий, по которому сервер
+    замечает закрытое соединение; через LIVE_MAX_DURATION поток
+    заканчивается, и браузер переподключается сам.
+    """
+    start_poller()
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT', HEARTBEAT)
+    deadline = time.monotonic() + getattr(
+        settings, 'LIVE_MAX_DURATION', MAX_DURATION)
+    subscription = hub.subscribe(channels)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        count = initial
+        if count:
+            yield event(count)
+        while time.monotonic() < deadline:
+            posts = subscription.get(heartbeat)
+            if posts:
+                count += len(posts)
+                yield event(count, max(posts))
+            else:
+                yield ': ping\n\n'
+    finally:
+        hub.unsubscribe(subscription)
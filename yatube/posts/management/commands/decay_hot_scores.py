@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import hot
+
+
+class Command(BaseCommand):
+    help = ('Приводит счёт популярности постов к текущему моменту; '
+            'запускать по расписанию, например раз в час')
+
+    def handle(self, *args, **options):
+        cooled = hot.decay()
+        self.stdout.write(f'Остывших постов: {cooled}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import uploads
+
+
+class Command(BaseCommand):
+    help = ('Отклоняет брошенные загрузки и удаляет их файлы; '
+            'запускать по расписанию, например раз в час')
+
+    def handle(self, *args, **options):
+        expired = uploads.expire_abandoned()
+        self.stdout.write(f'Отклонено брошенных загрузок: {expired}')
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.utils import BATCH_SIZE, map_chunks
+
+EXPORT_FIELDS = ('pk', 'text', 'pub_date', 'image', 'author__username',
+                 'group__slug')
+
+
+def serialize(rows):
+    return ''.join(
+        json.dumps(dict(row, pub_date=row['pub_date'].isoformat()),
+                   ensure_ascii=False) + '\n'
+        for row in rows
+    )
+
+
+class Command(BaseCommand):
+    help = 'Выгружает все посты в формате JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Файл; по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Сериализовать пачки в нескольких процессах')
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.values(*EXPORT_FIELDS)
+        chunks = map_chunks(queryset, serialize, options['chunk_size'],
+                            options['processes'], progress=self.report)
+        if not options['output']:
+            for lines in chunks:
+                self.stdout.write(lines, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for lines in chunks:
+                output.write(lines)
+
+    def report(self, done, total):
+        self.stderr.write(f'Выгружено {done} из {total}')
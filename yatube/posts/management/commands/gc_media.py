@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from posts.utils import chunked
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые не осталось ссылок, '
+            'вместе с их миниатюрами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-period', type=int, default=24 * 3600,
+                            help='Не трогать файлы моложе стольких секунд')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        referenced = set()
+        images = Post.objects.exclude(image='').values_list('pk', 'image')
+        for chunk in chunked(images):
+            referenced.update(name for _, name in chunk)
+        removed = 0
+        for name in storage.orphans(field.upload_to, referenced,
+                                    options['grace_period']):
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+                continue
+            # Миниатюры и их записи в kvstore ищутся по ключу исходника,
+            # поэтому он строится с тем же хранилищем, что и у поля.
+            image_file = ImageFile(name, storage)
+            default.kvstore.delete(image_file)
+            storage.purge(name)
+        self.stdout.write(
+            f'Файлов без ссылок: {removed}, используется: {len(referenced)}'
+        )
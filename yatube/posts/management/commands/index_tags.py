@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import tags
+from posts.models import Post
+from posts.utils import BATCH_SIZE, map_chunks
+
+
+class Command(BaseCommand):
+    help = 'Заново извлекает теги и упоминания из текста всех постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--processes', type=int, default=1)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.only('text', 'author_id')
+        links = mentions = 0
+        for chunk_links, chunk_mentions in map_chunks(
+                posts, tags.index_posts, options['chunk_size'],
+                options['processes']):
+            links += chunk_links
+            mentions += chunk_mentions
+        self.stdout.write(f'Тегов у постов: {links}, упоминаний: {mentions}')
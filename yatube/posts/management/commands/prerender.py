@@ -0,0 +1,51 @@
+import functools
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import prerender
+from posts.models import Group, Post, User
+from posts.utils import BATCH_SIZE, chunked, map_chunks
+
+
+class Command(BaseCommand):
+    help = ('Сохраняет на диск HTML анонимных страниц, данные которых '
+            'изменились с прошлого запуска, и удаляет лишние')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Перерисовать все страницы')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Процессов для отрисовки страниц постов')
+
+    def handle(self, *args, **options):
+        if not prerender.enabled():
+            raise CommandError('Не задан PRERENDER_ROOT')
+        force = options['force']
+        seen = set()
+        stats = prerender.prerender(prerender.about_pages(), force, seen)
+
+        def add(result):
+            for name, value in result.items():
+                stats[name] += value
+
+        add(prerender.prerender(prerender.index_pages(), force, seen))
+        for groups in chunked(Group.objects.all()):
+            add(prerender.prerender(
+                prerender.group_pages(groups), force, seen))
+        authors = User.objects.filter(
+            pk__in=Post.objects.values('author_id'))
+        for chunk in chunked(authors):
+            add(prerender.prerender(
+                prerender.profile_pages(chunk), force, seen))
+        # Страниц постов больше всего: их можно рисовать в несколько
+        # процессов.
+        for result, files in map_chunks(
+                Post.objects.only('pk'),
+                functools.partial(prerender.render_posts, force=force),
+                BATCH_SIZE, options['processes']):
+            add(result)
+            seen.update(files)
+        stats['removed'] += prerender.remove_unseen(seen)
+        self.stdout.write(
+            'Перерисовано: {rendered}, без изменений: {skipped}, '
+            'удалено: {removed}'.format(**stats))
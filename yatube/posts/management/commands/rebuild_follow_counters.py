@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import follows
+from posts.models import User
+from posts.utils import BATCH_SIZE, map_chunks
+
+
+def recount(users):
+    follows.recount([user.pk for user in users])
+    return len(users)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики подписок всех пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--processes', type=int, default=1)
+
+    def handle(self, *args, **options):
+        users = User.objects.only('pk')
+        total = sum(map_chunks(users, recount, options['chunk_size'],
+                               options['processes']))
+        self.stdout.write(f'Пересчитано пользователей: {total}')
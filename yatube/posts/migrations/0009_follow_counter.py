@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    FollowCounter = apps.get_model('posts', 'FollowCounter')
+    counters = {}
+    for field, counter_field in (('author', 'followers'),
+                                 ('user', 'following')):
+        rows = Follow.objects.order_by().values(field).annotate(
+            total=Count('pk'))
+        for row in rows:
+            counter = counters.setdefault(
+                row[field], FollowCounter(user_id=row[field]))
+            setattr(counter, counter_field, row['total'])
+    FollowCounter.objects.bulk_create(counters.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_auto_20230317_1257'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='follow_counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчик подписок',
+                'verbose_name_plural': 'Счётчики подписок',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0010_post_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер, байт')),
+                ('received', models.PositiveIntegerField(default=0, verbose_name='Получено, байт')),
+                ('status', models.CharField(choices=[('receiving', 'Загружается'), ('processing', 'Проверяется'), ('ready', 'Опубликована'), ('failed', 'Отклонена')], default='receiving', max_length=16, verbose_name='Статус')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('submitted', models.BooleanField(default=False, verbose_name='Пост отправлен')),
+                ('text', models.TextField(blank=True, verbose_name='Текст поста')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Начата')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='posts.Group', verbose_name='Группа')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Загрузка',
+                'verbose_name_plural': 'Загрузки',
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:32
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Значения из posts/hot.py на момент миграции.
+HALF_LIFE = 6 * 3600
+POST_WEIGHT = 3.0
+COMMENT_WEIGHT = 1.0
+
+
+def fill_scores(apps, schema_editor):
+    HotEpoch = apps.get_model('posts', 'HotEpoch')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    epoch = HotEpoch.objects.create(pk=1, started=timezone.now()).started
+
+    def weight(amount, at):
+        return amount * 2 ** ((at - epoch).total_seconds() / HALF_LIFE)
+
+    scores, activity = {}, {}
+    for pk, pub_date in Post.objects.values_list('pk', 'pub_date').iterator():
+        scores[pk] = weight(POST_WEIGHT, pub_date)
+        activity[pk] = pub_date
+    comments = Comment.objects.values_list('post_id', 'created').iterator()
+    for post_id, created in comments:
+        scores[post_id] += weight(COMMENT_WEIGHT, created)
+        activity[post_id] = max(activity[post_id], created)
+    Post.objects.bulk_update(
+        [Post(pk=pk, hot_score=score, last_activity=activity[pk])
+         for pk, score in scores.items()],
+        ('hot_score', 'last_activity'),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_content_addressed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotEpoch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(verbose_name='Начало отсчёта')),
+            ],
+            options={
+                'verbose_name': 'Отсчёт популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_activity',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Последняя активность'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
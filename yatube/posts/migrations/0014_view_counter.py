@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_hot_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewCounter',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_counter', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('views', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Просмотров')),
+            ],
+            options={
+                'verbose_name': 'Счётчик просмотров',
+                'verbose_name_plural': 'Счётчики просмотров',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0014_view_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedCursor',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_cursor', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('last_seen_id', models.PositiveIntegerField(default=0, verbose_name='Последний прочитанный пост')),
+                ('unread', models.PositiveIntegerField(default=0, verbose_name='Непрочитанных')),
+            ],
+            options={
+                'verbose_name': 'Курсор ленты подписок',
+                'verbose_name_plural': 'Курсоры ленты подписок',
+            },
+        ),
+    ]
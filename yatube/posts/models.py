@@ -1,6 +1,11 @@
+import uuid
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.querycache import CachingQuerySet
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -8,7 +13,8 @@ class Post(models.Model):
     text = models.TextField('Текст поста',
                             help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата публикации',
-                                    auto_now_add=True)
+                                    auto_now_add=True,
+                                    db_index=True)
     author = models.ForeignKey(
         User,
         verbose_name='Автор',
@@ -28,9 +34,24 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
+        db_index=True,
         help_text='Картинка для поста',
     )
+    last_activity = models.DateTimeField(
+        'Последняя активность',
+        null=True,
+        editable=False,
+    )
+    # Вклад публикации и комментариев с экспоненциальным затуханием,
+    # отсчитанный от HotEpoch (см. posts/hot.py).
+    hot_score = models.FloatField(
+        'Популярность',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
@@ -40,6 +61,25 @@ class Post(models.Model):
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Счётчики популярности меняются только UPDATE-ами из posts.hot:
+        # сохранение отредактированного поста не должно их затирать.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ('hot_score', 'last_activity')
+            ]
+        super().save(*args, **kwargs)
+
+
+class HotEpoch(models.Model):
+    """Точка отсчёта, к которой приведены значения Post.hot_score."""
+    started = models.DateTimeField('Начало отсчёта')
+
+    class Meta:
+        verbose_name = 'Отсчёт популярности'
+
 
 class Group(models.Model):
     title = models.CharField('Название группы',
@@ -52,6 +92,8 @@ class Group(models.Model):
     description = models.TextField('Краткое описание',
                                    help_text='Введите краткое описание группы')
 
+    objects = CachingQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -97,8 +139,195 @@ class Follow(models.Model):
         verbose_name='Автор поста',
     )
 
+    objects = CachingQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_username')
         ]
+
+
+class FollowCounter(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='follow_counter',
+        verbose_name='Пользователь',
+    )
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик подписок'
+        verbose_name_plural = 'Счётчики подписок'
+
+    def __str__(self):
+        return f'{self.user}: {self.followers}/{self.following}'
+
+
+class FeedCursor(models.Model):
+    """Докуда пользователь дочитал ленту подписок и сколько в ней нового."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_cursor',
+        verbose_name='Пользователь',
+    )
+    # Не внешний ключ: прочитанный пост могут удалить.
+    last_seen_id = models.PositiveIntegerField(
+        'Последний прочитанный пост', default=0)
+    unread = models.PositiveIntegerField('Непрочитанных', default=0)
+
+    class Meta:
+        verbose_name = 'Курсор ленты подписок'
+        verbose_name_plural = 'Курсоры ленты подписок'
+
+    def __str__(self):
+        return f'{self.user}: {self.last_seen_id} (+{self.unread})'
+
+
+class ViewCounter(models.Model):
+    """Просмотры поста; пишутся пачками из posts.utils.post_views."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='view_counter',
+        verbose_name='Пост',
+    )
+    views = models.PositiveIntegerField('Просмотров', default=0,
+                                        db_index=True)
+
+    class Meta:
+        verbose_name = 'Счётчик просмотров'
+        verbose_name_plural = 'Счётчики просмотров'
+
+    def __str__(self):
+        return f'{self.post_id}: {self.views}'
+
+
+class Tag(models.Model):
+    """Хештег из текста постов; имя хранится в нижнем регистре."""
+    name = models.CharField('Тег', max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """Связь поста с тегом; заполняется из posts.tags."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name='Пост',
+    )
+    # Отдельный индекс не нужен: tag — первый столбец составного.
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        db_index=False,
+        verbose_name='Тег',
+    )
+
+    class Meta:
+        verbose_name = 'Тег поста'
+        verbose_name_plural = 'Теги постов'
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'post'],
+                                    name='unique_post_tag')
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.tag_id}'
+
+
+class Mention(models.Model):
+    """Упоминание пользователя в посте; заполняется из posts.tags."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        verbose_name='Пост',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        db_index=False,
+        verbose_name='Пользователь',
+    )
+
+    class Meta:
+        verbose_name = 'Упоминание'
+        verbose_name_plural = 'Упоминания'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_mention')
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.user_id}'
+
+
+class Upload(models.Model):
+    """Картинка, которую загружают частями до публикации поста."""
+    RECEIVING = 'receiving'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (RECEIVING, 'Загружается'),
+        (PROCESSING, 'Проверяется'),
+        (READY, 'Опубликована'),
+        (FAILED, 'Отклонена'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='uploads',
+        verbose_name='Автор',
+    )
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.PositiveIntegerField('Размер, байт')
+    received = models.PositiveIntegerField('Получено, байт', default=0)
+    status = models.CharField('Статус',
+                              max_length=16,
+                              choices=STATUS_CHOICES,
+                              default=RECEIVING)
+    error = models.TextField('Ошибка', blank=True)
+    submitted = models.BooleanField('Пост отправлен', default=False)
+    text = models.TextField('Текст поста', blank=True)
+    group = models.ForeignKey(
+        Group,
+        verbose_name='Группа',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    created = models.DateTimeField('Начата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Загрузка'
+        verbose_name_plural = 'Загрузки'
+
+    def __str__(self):
+        return f'{self.filename} [{self.status}]'
@@ -0,0 +1,378 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+from urllib.parse import unquote
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core.counters import INTERNAL_REQUEST
+from core.fileserver import HEADERS_SUFFIX
+from core.staticfiles import compress_variants
+
+from .models import Comment, Follow, FollowCounter, Group, Post, User
+from .utils import CARD_FIELDS, ITEMS_PER_PAGE, card_queryset
+
+# Сколько первых страниц каждого списка держать на диске: дальние
+# страницы смотрят редко, а сдвигает их каждый новый пост.
+LIST_PAGES = 5
+GENERATION_SUFFIX = '.generation'
+# Заголовки middleware, которые core.fileserver повторяет, отдавая
+# страницу с диска: иначе готовую страницу можно встроить во фрейм.
+STORED_HEADERS = (
+    'X-Frame-Options', 'X-Content-Type-Options', 'X-XSS-Protection',
+    'Referrer-Policy', 'Strict-Transport-Security',
+    'Content-Security-Policy', 'Cross-Origin-Opener-Policy',
+)
+VARIANT_SUFFIXES = ('.gz', '.br')
+PAGE_FILE = re.compile(r'^page=(\d+)$')
+ABOUT_PAGES = ('about:author', 'about:tech')
+DETAIL_FIELDS = (
+    'pk', 'text', 'pub_date', 'image', 'author_id', 'author__username',
+    'author__first_name', 'author__last_name', 'group__slug', 'group__title',
+)
+
+# Страницы, затронутые записями текущей транзакции.
+_pending = threading.local()
+
+
+def enabled():
+    return bool(getattr(settings, 'PRERENDER_ROOT', None))
+
+
+def file_name(url):
+    """Файл страницы: <каталог адреса>/index.html или page-N.html.
+
+    По тем же правилам страницу ищет core.fileserver, а nginx —
+    через try_files $uri/page-$arg_page.html $uri/index.html (заголовки
+    безопасности тогда добавляет сам nginx).
+    None — у адреса нет файла: лишние параметры или сегменты «.», «..».
+    """
+    path, _, query = url.partition('?')
+    parts = unquote(path).split('/')[1:-1]
+    # Имя пользователя «..» не должно вывести файл за каталог раздела.
+    if any(part in ('', '.', '..') or os.sep in part for part in parts):
+        return None
+    name = 'index.html'
+    if query:
+        match = PAGE_FILE.match(query)
+        if match is None:
+            return None
+        name = f'page-{match.group(1)}.html'
+    return os.path.join(settings.PRERENDER_ROOT, *parts, name)
+
+
+@functools.lru_cache()
+def code_version():
+    """Время последнего изменения шаблонов и манифеста статики.
+
+    Входит в поколение каждой страницы: после выкладки с новыми шаблонами
+    или статикой все страницы перерисовываются.
+    """
+    paths = [os.path.join(settings.STATIC_ROOT, 'staticfiles.json')]
+    for engine in settings.TEMPLATES:
+        for directory in engine.get('DIRS', ()):
+            for folder, _, files in os.walk(directory):
+                paths += [os.path.join(folder, name) for name in files]
+    return max((os.stat(path).st_mtime_ns for path in paths
+                if os.path.exists(path)), default=0)
+
+
+def generation(data):
+    return hashlib.sha1(repr((code_version(), data)).encode()).hexdigest()
+
+
+def about_pages():
+    for name in ABOUT_PAGES:
+        yield reverse(name), ()
+
+
+def list_pages(url, queryset, extra=()):
+    """Первые LIST_PAGES страниц списка с данными их карточек.
+
+    Поколение страницы — число постов списка (от него зависит
+    пагинатор) и ровно те поля, что выводят карточки этой страницы.
+    """
+    count = queryset.count()
+    last = max(1, min(LIST_PAGES, -(-count // ITEMS_PER_PAGE)))
+    rows = card_queryset(queryset).values_list('pk', *CARD_FIELDS, 'preview')
+    for number in range(1, last + 1):
+        offset = (number - 1) * ITEMS_PER_PAGE
+        page_url = url if number == 1 else f'{url}?page={number}'
+        yield page_url, (extra, count,
+                         list(rows[offset:offset + ITEMS_PER_PAGE]))
+
+
+def index_pages():
+    return list_pages(reverse('posts:index'), Post.objects.all())
+
+
+def group_pages(groups):
+    for group in groups:
+        yield from list_pages(
+            reverse('posts:group_list', args=(group.slug,)),
+            Post.objects.filter(group=group),
+            (group.title, group.description))
+
+
+def profile_pages(authors):
+    followers = dict(FollowCounter.objects.filter(
+        pk__in=[author.pk for author in authors]).values_list(
+            'pk', 'followers'))
+    for author in authors:
+        yield from list_pages(
+            reverse('posts:profile', args=(author.username,)),
+            Post.objects.filter(author=author),
+            (author.get_full_name(), followers.get(author.pk, 0)))
+
+
+def detail_pages(post_ids):
+    """Страницы постов; у удалённых постов данных нет (None)."""
+    posts = {row[0]: row for row in Post.objects.filter(
+        pk__in=post_ids).values_list(*DETAIL_FIELDS)}
+    comments = {row[0]: row[1:] for row in Comment.objects.filter(
+        post_id__in=post_ids).order_by().values('post_id').annotate(
+            count=Count('pk'), last=Max('pk')).values_list(
+                'post_id', 'count', 'last')}
+    for post_id in sorted(set(post_ids)):
+        url = reverse('posts:post_detail', args=(post_id,))
+        row = posts.get(post_id)
+        if row is None:
+            yield url, None
+            continue
+        yield url, (row, comments.get(post_id))
+
+
+def render_posts(posts, force=False):
+    """Отрисовывает пачку постов; для map_chunks в команде prerender."""
+    seen = set()
+    stats = prerender(detail_pages([post.pk for post in posts]), force, seen)
+    return stats, seen
+
+
+@functools.lru_cache()
+def get_handler():
+    return WSGIHandler()
+
+
+def render(url):
+    """HTML страницы для анонимного посетителя и заголовки STORED_HEADERS.
+
+    Запрос проходит через все middleware, как настоящий, но без сигналов
+    начала и конца запроса: они закрыли бы соединение с БД вызывающего
+    кода. None — если страницу нельзя отдавать с диска: ответ не 200
+    или ставит cookie (например, CSRF-токен формы).
+    """
+    path, _, query = url.partition('?')
+    host = settings.ALLOWED_HOSTS[0]
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': unquote(path).encode().decode('latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_NAME': host,
+        'HTTP_HOST': host,
+        INTERNAL_REQUEST: True,
+    }
+    setup_testing_defaults(environ)
+    response = get_handler().get_response(WSGIRequest(environ))
+    if response.status_code != 200 or response.cookies:
+        return None
+    headers = [(name, response[name]) for name in STORED_HEADERS
+               if response.has_header(name)]
+    if response.streaming:
+        return b''.join(response.streaming_content), headers
+    return response.content, headers
+
+
+def stored_generation(target):
+    try:
+        with open(target + GENERATION_SUFFIX) as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_atomic(target, data):
+    temporary = f'{target}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, target)
+
+
+def remove(target):
+    for suffix in ('', *VARIANT_SUFFIXES, HEADERS_SUFFIX, GENERATION_SUFFIX):
+        try:
+            os.remove(target + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def store(target, html, headers, page_generation):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    for suffix in VARIANT_SUFFIXES:
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    write_atomic(target + HEADERS_SUFFIX, json.dumps(headers).encode())
+    write_atomic(target, html)
+    compress_variants(target)
+    write_atomic(target + GENERATION_SUFFIX, page_generation.encode())
+
+
+def prerender(pages, force=False, seen=None):
+    """Пишет на диск страницы, поколение данных которых изменилось.
+
+    ``pages`` — пары (адрес, данные страницы). Данные читаются до
+    рендеринга, поэтому записанный HTML не старее своего поколения:
+    изменение, случившееся между ними, перерисует страницу ещё раз.
+    В ``seen`` собираются файлы, которые должны остаться на диске.
+    """
+    stats = {'rendered': 0, 'skipped': 0, 'removed': 0}
+    for url, data in pages:
+        target = file_name(url)
+        if target is None:
+            continue
+        page_generation = None if data is None else generation(data)
+        if (page_generation is not None and not force
+                and stored_generation(target) == page_generation
+                and os.path.exists(target + HEADERS_SUFFIX)):
+            stats['skipped'] += 1
+        else:
+            rendered = None if data is None else render(url)
+            if rendered is None:
+                remove(target)
+                stats['removed'] += 1
+                continue
+            store(target, *rendered, page_generation)
+            stats['rendered'] += 1
+        if seen is not None:
+            seen.add(target)
+    return stats
+
+
+def remove_unseen(seen):
+    """Удаляет страницы, которых больше нет: посты, группы, авторы."""
+    removed = 0
+    pattern = os.path.join(settings.PRERENDER_ROOT, '**', '*.html')
+    for target in glob.glob(pattern, recursive=True):
+        if target not in seen:
+            remove(target)
+            removed += 1
+    return removed
+
+
+def affected_pages(post_ids=(), group_ids=(), author_ids=(), index=False):
+    if index:
+        yield from index_pages()
+    yield from group_pages(Group.objects.filter(pk__in=group_ids))
+    yield from profile_pages(list(User.objects.filter(pk__in=author_ids)))
+    yield from detail_pages(post_ids)
+
+
+def discard(post_ids=(), group_ids=(), author_ids=(), index=False):
+    """Сразу убирает с диска страницы, которые изменились."""
+    lists = [reverse('posts:index')] if index else []
+    lists += [reverse('posts:group_list', args=(slug,)) for slug in
+              Group.objects.filter(pk__in=group_ids).values_list(
+                  'slug', flat=True)]
+    lists += [reverse('posts:profile', args=(username,)) for username in
+              User.objects.filter(pk__in=author_ids).values_list(
+                  'username', flat=True)]
+    for url in lists:
+        first_page = file_name(url)
+        if first_page is None:
+            continue
+        directory = os.path.dirname(first_page)
+        for target in glob.glob(os.path.join(directory, '*.html')):
+            remove(target)
+    for post_id in post_ids:
+        remove(file_name(reverse('posts:post_detail', args=(post_id,))))
+
+
+def schedule(post_ids=(), group_ids=(), author_ids=(), index=False):
+    """Перерисовывает после коммита страницы, затронутые записью.
+
+    Изменившиеся страницы удаляются с диска сразу, так что до
+    перерисовки их строит Django и устаревший HTML не отдаётся,
+    а отрисовка уходит в фоновую задачу. Все записи одной транзакции
+    (например, каскадное удаление комментариев поста) дают одну задачу.
+    """
+    if not enabled():
+        return
+    pages = getattr(_pending, 'pages', None)
+    if pages is None:
+        pages = _pending.pages = {
+            'post_ids': set(), 'group_ids': set(), 'author_ids': set(),
+            'index': False,
+        }
+    pages['post_ids'].update(post_ids)
+    pages['group_ids'].update(group_ids)
+    pages['author_ids'].update(author_ids)
+    pages['index'] = pages['index'] or index
+    transaction.on_commit(flush)
+
+
+def flush():
+    from .tasks import refresh_prerendered
+
+    pages = getattr(_pending, 'pages', None)
+    if pages is None:
+        return
+    del _pending.pages
+    pages = {
+        'post_ids': sorted(pages['post_ids']),
+        'group_ids': sorted(pages['group_ids'] - {None}),
+        'author_ids': sorted(pages['author_ids']),
+        'index': pages['index'],
+    }
+    discard(**pages)
+    refresh_prerendered.delay(**pages)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    if enabled() and instance.pk:
+        instance.previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    if not enabled():
+        return
+    schedule([instance.pk],
+             [instance.group_id, getattr(instance, 'previous_group_id', None)],
+             [instance.author_id], index=True)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    if enabled():
+        schedule([instance.pk], [instance.group_id], [instance.author_id],
+                 index=True)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    schedule([instance.post_id])
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    schedule(group_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    schedule(author_ids=[instance.author_id])
@@ -0,0 +1,72 @@
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max
+from django.urls import reverse
+
+from .models import Post
+from .utils import chunked
+
+# Больше 50 000 адресов в одном файле карты поисковики не читают.
+SITEMAP_SIZE = 50000
+SITEMAP_CACHE_TIMEOUT = 7 * 24 * 3600
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def section_range(number):
+    """Посты файла карты: номер n охватывает pk от (n-1)*SIZE+1 до n*SIZE.
+
+    Границы по первичному ключу не сдвигаются при удалении постов,
+    поэтому удаление или новый комментарий меняют только один файл.
+    """
+    return (number - 1) * SITEMAP_SIZE + 1, number * SITEMAP_SIZE
+
+
+def section_signature(number):
+    """Данные, от которых зависит файл карты: число постов, последний pk
+    и время последней активности. Один запрос по диапазону ключа."""
+    first, last = section_range(number)
+    return Post.objects.filter(pk__range=(first, last)).aggregate(
+        count=Count('pk'), last=Max('pk'), activity=Max('last_activity'))
+
+
+def section_signatures():
+    """Подписи всех непустых файлов карты одним GROUP BY."""
+    section = ExpressionWrapper(
+        (F('pk') - 1) / SITEMAP_SIZE + 1, output_field=IntegerField())
+    rows = Post.objects.order_by().annotate(section=section).values(
+        'section').annotate(
+            count=Count('pk'), last=Max('pk'),
+            activity=Max('last_activity')).order_by('section')
+    return {row.pop('section'): row for row in rows}
+
+
+def render_index(base, signatures):
+    """XML индекса карты; ``base`` — схема и хост сайта."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             f'<sitemapindex xmlns="{XMLNS}">']
+    for number, signature in signatures.items():
+        location = base + reverse('posts:sitemap_section', args=(number,))
+        lines.append(f'<sitemap><loc>{escape(location)}</loc>')
+        if signature['activity']:
+            lines.append(
+                f'<lastmod>{signature["activity"].isoformat()}</lastmod>')
+        lines.append('</sitemap>')
+    lines.append('</sitemapindex>')
+    return '\n'.join(lines).encode()
+
+
+def render_section(base, number):
+    """XML файла карты; посты читаются пачками по ключу."""
+    first, last = section_range(number)
+    posts = Post.objects.filter(pk__range=(first, last)).values_list(
+        'pk', 'pub_date', 'last_activity')
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             f'<urlset xmlns="{XMLNS}">']
+    for chunk in chunked(posts):
+        for pk, pub_date, last_activity in chunk:
+            location = base + reverse('posts:post_detail', args=(pk,))
+            modified = (last_activity or pub_date).isoformat()
+            lines.append(f'<url><loc>{escape(location)}</loc>'
+                         f'<lastmod>{modified}</lastmod></url>')
+    lines.append('</urlset>')
+    return '\n'.join(lines).encode()
@@ -0,0 +1,68 @@
+import re
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Mention, Post, PostTag, Tag, User
+from .utils import BATCH_SIZE
+
+# Перед # и @ не должно быть буквы: иначе это адрес почты, якорь ссылки
+# или HTML-сущность вроде &#39; в уже экранированном тексте.
+TAG_RE = re.compile(r'(?<![\w&])#(\w+)')
+MENTION_RE = re.compile(r'(?<![\w@.])@(\w+(?:[.+-]\w+)*)')
+MAX_TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def extract(text):
+    """Теги (в нижнем регистре) и имена упомянутых пользователей."""
+    tags = {name.lower() for name in TAG_RE.findall(text)
+            if len(name) <= MAX_TAG_LENGTH}
+    return tags, set(MENTION_RE.findall(text))
+
+
+def index_posts(posts):
+    """Пересобирает теги и упоминания пачки постов.
+
+    На всю пачку — по запросу на новые теги, их id, id пользователей,
+    удаление старых связей и вставку новых, поэтому годится и для
+    массового импорта, где сигналы не срабатывают. Возвращает число
+    записанных связей с тегами и упоминаний.
+    """
+    found = {post.pk: (post.author_id, *extract(post.text))
+             for post in posts}
+    if not found:
+        return 0, 0
+    names = set().union(*(tags for _, tags, _ in found.values()))
+    usernames = set().union(*(users for _, _, users in found.values()))
+    with transaction.atomic():
+        Tag.objects.bulk_create([Tag(name=name) for name in names],
+                                batch_size=BATCH_SIZE, ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list(
+            'name', 'pk'))
+        user_ids = dict(User.objects.filter(
+            username__in=usernames).values_list('username', 'pk'))
+        links = [PostTag(post_id=pk, tag_id=tag_ids[name])
+                 for pk, (_, tags, _) in found.items() for name in tags]
+        mentions = [
+            Mention(post_id=pk, user_id=user_ids[username])
+            for pk, (author_id, _, users) in found.items()
+            for username in users
+            if user_ids.get(username, author_id) != author_id
+        ]
+        PostTag.objects.filter(post_id__in=found).delete()
+        Mention.objects.filter(post_id__in=found).delete()
+        PostTag.objects.bulk_create(links, batch_size=BATCH_SIZE)
+        Mention.objects.bulk_create(mentions, batch_size=BATCH_SIZE)
+    return len(links), len(mentions)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, update_fields, **kwargs):
+    # Фикстуры индексирует команда index_tags; правкам без текста
+    # и новым постам без тегов и упоминаний индекс не нужен.
+    if raw or (update_fields is not None and 'text' not in update_fields):
+        return
+    if created and not any(extract(instance.text)):
+        return
+    index_posts([instance])
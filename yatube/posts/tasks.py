@@ -0,0 +1,131 @@
+import logging
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import report_progress, task
+
+from . import follows, prerender, uploads
+from .models import Comment, Follow, Post, Upload, User
+from .utils import bump_content_generation, chunked
+
+logger = logging.getLogger(__name__)
+
+# Геометрия миниатюры из includes/post_card.html и posts/post_detail.html.
+CARD_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+MODERATION_CHUNK_SIZE = 500
+
+
+@task
+def warm_thumbnail(post_id):
+    """Заранее строит миниатюру, чтобы первый просмотр её не ждал."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    geometry, options = CARD_THUMBNAIL
+    get_thumbnail(post.image, geometry, **options)
+
+
+def _in_chunks(ids, size=MODERATION_CHUNK_SIZE):
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), size):
+        yield start + size, ids[start:start + size]
+
+
+@task
+def delete_posts(post_ids):
+    """Удаляет посты пачками вместе с комментариями к ним."""
+    for done, chunk in _in_chunks(post_ids):
+        with transaction.atomic():
+            Post.objects.filter(pk__in=chunk).delete()
+        report_progress(done, len(post_ids))
+    bump_content_generation()
+
+
+@task
+def delete_comments(comment_ids):
+    for done, chunk in _in_chunks(comment_ids):
+        with transaction.atomic():
+            Comment.objects.filter(pk__in=chunk).delete()
+        report_progress(done, len(comment_ids))
+    bump_content_generation()
+
+
+@task
+def move_posts(post_ids, group_id):
+    """Переносит посты в другую группу (или убирает из группы при None)."""
+    moved = Post.objects.filter(pk__in=post_ids)
+    groups = set(moved.values_list('group_id', flat=True).distinct())
+    authors = set(moved.values_list('author_id', flat=True).distinct())
+    for done, chunk in _in_chunks(post_ids):
+        Post.objects.filter(pk__in=chunk).update(group_id=group_id)
+        report_progress(done, len(post_ids))
+    bump_content_generation()
+    # update() не шлёт сигналов, поэтому готовые страницы обновляются явно.
+    prerender.schedule(post_ids, groups | {group_id}, authors, index=True)
+
+
+@task
+def purge_authors(user_ids):
+    """Удаляет весь контент спамеров: посты, комментарии и подписки."""
+    posts = Post.objects.filter(author_id__in=user_ids)
+    comments = Comment.objects.filter(author_id__in=user_ids)
+    total = posts.count() + comments.count()
+    done = 0
+    for queryset in (posts, comments):
+        ids = queryset.values_list('pk', flat=True)
+        for chunk in chunked(ids, MODERATION_CHUNK_SIZE):
+            with transaction.atomic():
+                queryset.model.objects.filter(pk__in=chunk).delete()
+            done += len(chunk)
+            report_progress(done, total)
+    for user_id in user_ids:
+        spammer = User(pk=user_id)
+        authors = list(Follow.objects.filter(
+            user_id=user_id).values_list('author_id', flat=True))
+        follows.bulk_unfollow(spammer, authors)
+    follows.remove_followers(user_ids)
+    bump_content_generation()
+
+
+@task
+def process_upload(upload_id):
+    """Проверяет загруженную картинку и только после этого публикует пост.
+
+    Пост и статус загрузки записываются в одной транзакции, поэтому
+    повтор задачи после публикации не создаст второй пост.
+    """
+    upload = Upload.objects.get(pk=upload_id)
+    if upload.status != Upload.PROCESSING:
+        return
+    path = uploads.upload_path(upload)
+    try:
+        uploads.validate_image(path)
+        with open(path, 'rb') as image, transaction.atomic():
+            post = Post(author_id=upload.user_id,
+                        text=upload.text,
+                        group_id=upload.group_id)
+            post.image.save(upload.filename, File(image), save=False)
+            post.save()
+            upload.status = Upload.READY
+            upload.post = post
+            upload.save(update_fields=('status', 'post'))
+    except ValidationError as error:
+        uploads.fail(upload, ' '.join(error.messages))
+        return
+    except Exception:
+        logger.exception('Не удалось опубликовать загрузку %s', upload_id)
+        uploads.fail(upload, 'Не удалось сохранить изображение.')
+        return
+    uploads.remove_part(upload)
+    warm_thumbnail.delay(post.pk)
+
+
+@task
+def refresh_prerendered(post_ids=(), group_ids=(), author_ids=(),
+                        index=False):
+    """Перерисовывает на диске страницы, затронутые записью."""
+    prerender.prerender(prerender.affected_pages(
+        post_ids, group_ids, author_ids, index))
@@ -0,0 +1,73 @@
+from functools import lru_cache
+from urllib.parse import quote
+
+from django import template
+from django.urls import get_script_prefix, reverse
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from ..tags import MENTION_RE, TAG_RE
+from ..utils import PREVIEW_LENGTH
+
+register = template.Library()
+
+# Заглушка подходит под конвертеры int, str и slug, поэтому по ней можно
+# один раз построить адрес и дальше лишь подставлять значение.
+URL_ARG_MARKER = '9081726354'
+URL_SAFE_CHARS = "!$&'()*+,;=/~:@"
+
+
+@lru_cache(maxsize=None)
+def url_parts(view_name, script_prefix):
+    prefix, suffix = reverse(view_name, args=[URL_ARG_MARKER]).split(
+        URL_ARG_MARKER)
+    return prefix, suffix
+
+
+def build_url(view_name, arg):
+    """Аналог reverse() для адресов с одним аргументом без разбора URLconf."""
+    prefix, suffix = url_parts(view_name, get_script_prefix())
+    return prefix + quote(str(arg), safe=URL_SAFE_CHARS) + suffix
+
+
+@register.inclusion_tag('includes/post_card.html', takes_context=True)
+def post_card(context, post, last=False):
+    # followed_ids кладут в контекст только страницы с кнопками подписки.
+    followed_ids = context.get('followed_ids')
+    user = context.get('user')
+    can_follow = (followed_ids is not None
+                  and post.author_id != user.id
+                  and post.author_id not in followed_ids)
+    # last_seen_id есть только в ленте подписок.
+    last_seen_id = context.get('last_seen_id')
+    # Посты из card_queryset приходят с началом текста в preview.
+    text = getattr(post, 'preview', None)
+    if text is None:
+        text = post.text
+    return {
+        'post': post,
+        'last': last,
+        'text': text[:PREVIEW_LENGTH],
+        'truncated': len(text) > PREVIEW_LENGTH,
+        'unread': last_seen_id is not None and post.pk > last_seen_id,
+        'follow_url': (build_url('posts:profile_follow',
+                                 post.author.username)
+                       if can_follow else None),
+        'profile_url': build_url('posts:profile', post.author.username),
+        'detail_url': build_url('posts:post_detail', post.pk),
+        'group_url': (build_url('posts:group_list', post.group.slug)
+                      if post.group_id else None),
+    }
+
+
+@register.filter(needs_autoescape=True)
+def linkify(text, autoescape=True):
+    """Превращает #теги и @имена в тексте поста в ссылки."""
+    if autoescape:
+        text = conditional_escape(text)
+    text = TAG_RE.sub(lambda match: '<a href="{}">{}</a>'.format(
+        build_url('posts:tag_posts', match.group(1).lower()),
+        match.group(0)), text)
+    text = MENTION_RE.sub(lambda match: '<a href="{}">{}</a>'.format(
+        build_url('posts:profile', match.group(1)), match.group(0)), text)
+    return mark_safe(text)
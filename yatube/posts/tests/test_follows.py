@@ -0,0 +1,235 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import versions
+
+from .. import follows, unread
+from ..follows import graph
+from ..models import Follow, FollowCounter, Group, Post, User
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(6)
+        ]
+        first, second, third, fourth, fifth, _ = cls.users
+        Follow.objects.bulk_create([
+            Follow(user=first, author=second),
+            Follow(user=first, author=third),
+            Follow(user=second, author=fourth),
+            Follow(user=third, author=fourth),
+            Follow(user=third, author=fifth),
+            Follow(user=fourth, author=first),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_followed_among(self):
+        """Пакетная проверка подписок одним обращением к графу."""
+        first = self.users[0]
+        author_ids = [user.id for user in self.users]
+        self.assertEqual(
+            graph.followed_among(first.id, author_ids),
+            {self.users[1].id, self.users[2].id})
+        self.assertTrue(graph.follows(first.id, self.users[1].id))
+        self.assertFalse(graph.follows(first.id, self.users[3].id))
+
+    def test_lookup_in_transaction_reads_only_asked_rows(self):
+        """Внутри транзакции граф не перечитывается из БД целиком."""
+        first, second = self.users[:2]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(graph.follows(first.id, second.id))
+        self.assertEqual(len(queries), 1)
+        self.assertIn('WHERE', queries[0]['sql'])
+
+    def test_cursor_pagination(self):
+        """Подписчики и подписки отдаются страницами по курсору."""
+        fourth = self.users[3]
+        page, cursor = graph.followers(fourth.id, limit=1)
+        self.assertEqual(page, [self.users[1].id])
+        page, cursor = graph.followers(fourth.id, after=cursor, limit=1)
+        self.assertEqual(page, [self.users[2].id])
+        self.assertIsNone(cursor)
+
+    def test_suggestions_use_second_degree(self):
+        """Предлагаются авторы, которых читают мои подписки."""
+        first = self.users[0]
+        self.assertEqual(
+            graph.suggestions(first.id),
+            [self.users[3].id, self.users[4].id])
+
+    def test_group_page_shows_follow_buttons(self):
+        """На странице группы у чужих авторов есть кнопка подписки."""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for author in self.users[1:5]:
+            Post.objects.create(author=author, text='Текст', group=group)
+        client = Client()
+        client.force_login(self.users[0])
+        response = client.get(
+            reverse('posts:group_list', kwargs={'slug': group.slug}))
+        self.assertEqual(response.context['followed_ids'],
+                         {self.users[1].id, self.users[2].id})
+        for author, expected in ((self.users[1], 0), (self.users[3], 1)):
+            with self.subTest(author=author):
+                url = reverse('posts:profile_follow', args=[author.username])
+                self.assertContains(response, f'href="{url}"',
+                                    count=expected)
+
+
+class FollowGraphCacheTests(TransactionTestCase):
+    """Вне транзакции граф берётся из памяти процесса."""
+
+    def setUp(self):
+        versions.get_cache().clear()
+        self.reader, self.author = [
+            User.objects.create_user(username=name)
+            for name in ('reader', 'author')
+        ]
+
+    def test_change_from_other_process_is_seen_by_version(self):
+        self.assertFalse(graph.follows(self.reader.id, self.author.id))
+        # Подписка из другого процесса: строка появилась без сигналов,
+        # а версия сменилась в общем кеше.
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        with self.assertNumQueries(0):
+            self.assertFalse(graph.follows(self.reader.id, self.author.id))
+        versions.bump(follows.GRAPH_VERSION_KEY)
+        self.assertTrue(graph.follows(self.reader.id, self.author.id))
+
+    def test_follow_in_this_process_updates_graph_in_place(self):
+        graph.follows(self.reader.id, self.author.id)
+        follows.follow(self.reader, self.author)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.follows(self.reader.id, self.author.id))
+            self.assertEqual(graph.followers(self.author.id),
+                             ([self.reader.id], None))
+
+
+class FollowOperationsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def counters(self, user):
+        counter = FollowCounter.objects.filter(pk=user.pk).first()
+        return (counter.followers, counter.following) if counter else (0, 0)
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка не создаёт дублей и не сбивает счётчики."""
+        author = self.authors[0]
+        url = reverse('posts:profile_follow', args=[author.username])
+        for _ in range(2):
+            self.client.get(url)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=author).count(), 1)
+        self.assertEqual(self.counters(author), (1, 0))
+        self.assertEqual(self.counters(self.user), (0, 1))
+        self.assertTrue(graph.follows(self.user.id, author.id))
+
+    def test_unfollow_missing_subscription(self):
+        """Отписка от автора без подписки не падает."""
+        author = self.authors[0]
+        follows.follow(self.user, author)
+        url = reverse('posts:profile_unfollow', args=[author.username])
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertFalse(Follow.objects.filter(author=author).exists())
+        self.assertEqual(self.counters(author), (0, 0))
+
+    def test_self_follow_is_ignored(self):
+        """Подписаться на самого себя нельзя."""
+        self.assertFalse(follows.follow(self.user, self.user))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_bulk_follow_and_unfollow(self):
+        """Массовые операции поддерживают счётчики в согласии с таблицей."""
+        ids = [author.id for author in self.authors]
+        follows.follow(self.user, self.authors[0])
+        follows.bulk_follow(self.user, ids + [self.user.id])
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(self.counters(self.user), (0, 3))
+        follows.bulk_unfollow(self.user, ids[:2])
+        self.assertEqual(self.counters(self.user), (0, 1))
+        self.assertEqual(self.counters(self.authors[0]), (0, 0))
+        self.assertEqual(self.counters(self.authors[2]), (1, 0))
+
+
+class UnreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.stranger = User.objects.create_user(username='stranger')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.seen = Post.objects.create(author=cls.author, text='Старый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        self.client.get(reverse('posts:follow_index'))
+
+    def test_new_posts_of_followed_authors_are_counted(self):
+        """Счётчик растёт только от постов авторов из подписок."""
+        self.assertEqual(unread.unread_count(self.reader.id), 0)
+        Post.objects.create(author=self.author, text='Новый пост')
+        Post.objects.create(author=self.stranger, text='Чужой пост')
+        self.assertEqual(unread.unread_count(self.reader.id), 1)
+        with self.assertNumQueries(0):
+            unread.unread_count(self.reader.id)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<span class="badge bg-danger">1</span>')
+
+    def test_feed_marks_new_posts_and_resets_count(self):
+        fresh = Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, f'id="post-{fresh.pk}"')
+        self.assertNotContains(response, f'id="post-{self.seen.pk}"')
+        self.assertEqual(unread.unread_count(self.reader.id), 0)
+
+    def test_jump_to_first_unread(self):
+        """Переход к самому старому непрочитанному посту."""
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(12)]
+        response = self.client.get(
+            reverse('posts:follow_index'), {'unread': 1})
+        self.assertRedirects(
+            response,
+            f'{reverse("posts:follow_index")}?page=2#post-{posts[0].pk}',
+            fetch_redirect_response=False)
+        self.assertEqual(unread.unread_count(self.reader.id), 12)
+        Post.objects.filter(pk=posts[0].pk).delete()
+        self.assertEqual(unread.unread_count(self.reader.id), 11)
+
+    def test_follow_and_unfollow_recount_unread(self):
+        """Подписка добавляет в счёт новые посты автора, отписка убирает."""
+        Post.objects.create(author=self.stranger, text='Пост до подписки')
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(unread.unread_count(self.reader.id), 1)
+        follows.follow(self.reader, self.stranger)
+        self.assertEqual(unread.unread_count(self.reader.id), 2)
+        follows.unfollow(self.reader, self.author)
+        self.assertEqual(unread.unread_count(self.reader.id), 1)
+        follows.bulk_unfollow(self.reader, [self.stranger.pk])
+        self.assertEqual(unread.unread_count(self.reader.id), 0)
+        follows.bulk_follow(self.reader, [self.author.pk, self.stranger.pk])
+        self.assertEqual(unread.unread_count(self.reader.id), 2)
@@ -1,14 +1,33 @@
+import os
 import shutil
 import tempfile
+from datetime import timedelta
+from http import HTTPStatus
+from io import StringIO
 
 from django.conf import settings
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from ..models import Comment, Group, Post, User
+from core.tasks import run_pending
+
+from .. import uploads
+from ..models import Comment, Group, Post, Upload, User
+from ..tasks import process_upload
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -109,6 +128,19 @@ class PostPagesTests(TestCase):
         )
         self.assertEqual(Comment.objects.count(), comment_count + 1)
 
+    @override_settings(RATELIMITS=dict(settings.RATELIMITS, comment='2/m'))
+    def test_comment_flood_is_throttled(self):
+        """Сверх лимита комментарии отклоняются с ответом 429."""
+        caches[settings.RATELIMIT_CACHE].clear()
+        comment_count = Comment.objects.count()
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        for _ in range(2):
+            self.authorized_client.post(url, data={'text': 'Спам'})
+        response = self.authorized_client.post(url, data={'text': 'Спам'})
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(Comment.objects.count(), comment_count + 2)
+
     def test_guest_client_comment(self):
         comment_count = Comment.objects.count()
         form_data = {
@@ -120,3 +152,125 @@ class PostPagesTests(TestCase):
             follow=True
         )
         self.assertEqual(Comment.objects.count(), comment_count)
+
+
+UPLOAD_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, UPLOAD_CHUNKS_DIR=UPLOAD_DIR)
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(UPLOAD_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def start(self, content, filename='small.gif'):
+        response = self.client.post(reverse('posts:upload_start'), {
+            'filename': filename,
+            'size': len(content),
+        })
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        return reverse('posts:upload_chunk',
+                       kwargs={'upload_id': response.json()['id']})
+
+    def put(self, url, data, offset):
+        return self.client.put(url, data,
+                               content_type='application/octet-stream',
+                               HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resumable_upload_publishes_post_after_validation(self):
+        """Картинка загружается частями, пост появляется после проверки."""
+        url = self.start(SMALL_GIF)
+        self.assertEqual(self.put(url, SMALL_GIF[:20], 0).json(),
+                         {'offset': 20})
+        response = self.put(url, SMALL_GIF[5:], 5)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(self.client.get(url).json()['offset'], 20)
+        self.put(url, SMALL_GIF[20:], 20)
+        upload = Upload.objects.get()
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с частями',
+            'upload': upload.pk,
+        })
+        self.assertFalse(Post.objects.exists())
+        run_pending()
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, Upload.READY)
+        self.assertEqual(upload.post.text, 'Пост с частями')
+        self.assertTrue(upload.post.image)
+
+    def test_broken_image_is_rejected(self):
+        """Битый файл отклоняется воркером, пост не публикуется."""
+        content = b'GIF89a' + b'\x00' * 30
+        url = self.start(content)
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с битой картинкой',
+            'upload': url.split('/')[-2],
+        })
+        self.put(url, content, 0)
+        run_pending()
+        upload = Upload.objects.get()
+        self.assertEqual(upload.status, Upload.FAILED)
+        self.assertTrue(upload.error)
+        self.assertFalse(Post.objects.exists())
+
+    def test_failed_save_marks_upload_failed(self):
+        """Ошибка при сохранении не оставляет загрузку на проверке."""
+        url = self.start(SMALL_GIF)
+        self.put(url, SMALL_GIF, 0)
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост без места на диске',
+            'upload': url.split('/')[-2],
+        })
+        blocker = os.path.join(UPLOAD_DIR, 'not-a-directory')
+        open(blocker, 'w').close()
+        with self.settings(MEDIA_ROOT=blocker):
+            run_pending()
+        upload = Upload.objects.get()
+        self.assertEqual(upload.status, Upload.FAILED)
+        self.assertFalse(os.path.exists(uploads.upload_path(upload)))
+        self.assertFalse(Post.objects.exists())
+
+    def test_repeated_task_does_not_duplicate_post(self):
+        url = self.start(SMALL_GIF)
+        self.put(url, SMALL_GIF, 0)
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Один пост',
+            'upload': url.split('/')[-2],
+        })
+        run_pending()
+        process_upload(url.split('/')[-2])
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_abandoned_uploads_expire(self):
+        """Брошенная загрузка отклоняется вместе с файлом частей."""
+        self.start(SMALL_GIF)
+        upload = Upload.objects.get()
+        Upload.objects.update(created=timezone.now() - timedelta(
+            seconds=settings.UPLOAD_EXPIRE_AFTER + 1))
+        self.start(SMALL_GIF)
+        out = StringIO()
+        call_command('expire_uploads', stdout=out)
+        self.assertIn('Отклонено брошенных загрузок: 1', out.getvalue())
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, Upload.FAILED)
+        self.assertFalse(os.path.exists(uploads.upload_path(upload)))
+        self.assertEqual(
+            Upload.objects.filter(status=Upload.RECEIVING).count(), 1)
+
+    def test_wrong_extension_is_refused(self):
+        response = self.client.post(reverse('posts:upload_start'), {
+            'filename': 'script.exe',
+            'size': 10,
+        })
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
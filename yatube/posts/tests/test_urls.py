@@ -2,7 +2,12 @@ from http import HTTPStatus
 
 from django.test import Client, TestCase
 
-from ..models import Group, Post, User
+from core.models import Task
+from core.tasks import run_pending
+
+from .. import follows
+from ..models import Comment, Follow, FollowCounter, Group, Post, User
+from ..utils import content_generation
 
 
 class PostURLTests(TestCase):
@@ -99,3 +104,80 @@ class PostURLTests(TestCase):
             f'/posts/{self.post.id}/edit/', follow=True)
         self.assertRedirects(
             response, f'/posts/{self.post.id}/')
+
+    def test_admin_post_changelist_uses_estimated_count(self):
+        """Список постов в админке открывается без точного COUNT(*)."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        url = '/admin/posts/post/'
+        for params in ('', f'?q={self.user.username}', f'?q={self.post.pk}'):
+            with self.subTest(params=params):
+                response = client.get(url + params)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn(self.post, response.context['cl'].result_list)
+                self.assertIsNone(response.context['cl'].full_result_count)
+        # Число ищется и как id, и в тексте.
+        numeric = Post.objects.create(author=self.user, text='2023')
+        response = client.get(url, {'q': '2023'})
+        self.assertIn(numeric, response.context['cl'].result_list)
+        response = client.get(url, {'q': '99999999999999999999'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        # Совпадение с именем автора не скрывает совпадения в тексте.
+        mention = Post.objects.create(
+            author=self.user1, text=f'Ответ для {self.user.username}')
+        response = client.get(url, {'q': self.user.username})
+        self.assertIn(self.post, response.context['cl'].result_list)
+        self.assertIn(mention, response.context['cl'].result_list)
+
+    def test_admin_bulk_actions_run_in_background(self):
+        """Массовые действия админки выполняются фоновыми задачами."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        spam = Post.objects.create(author=self.user1, text='Спам')
+        Comment.objects.create(post=self.post, author=self.user1, text='Спам')
+        follows.follow(self.user, self.user1)
+        follows.follow(self.user1, self.user)
+        client.post('/admin/posts/post/', {
+            'action': 'move_to_group',
+            'group': self.group.pk,
+            '_selected_action': [self.post.pk],
+        })
+        client.post('/admin/posts/post/', {
+            'action': 'purge_authors',
+            '_selected_action': [spam.pk],
+        })
+        self.assertTrue(Post.objects.filter(pk=spam.pk).exists())
+        generation = content_generation()
+        self.assertEqual(run_pending(), 2)
+        # Поколение общее для процессов: воркер сбрасывает кеш страниц.
+        self.assertNotEqual(content_generation(), generation)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.group, self.group)
+        self.assertFalse(Post.objects.filter(author=self.user1).exists())
+        self.assertFalse(Comment.objects.filter(author=self.user1).exists())
+        # Подписки спамера и на спамера удалены вместе со счётчиками.
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            set(FollowCounter.objects.values_list(
+                'followers', 'following')), {(0, 0)})
+        self.assertEqual(
+            set(Task.objects.values_list('progress', flat=True)), {100})
+
+    def test_admin_move_to_missing_group_is_rejected(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        for group in ('abc', '999999'):
+            with self.subTest(group=group):
+                response = client.post('/admin/posts/post/', {
+                    'action': 'move_to_group',
+                    'group': group,
+                    '_selected_action': [self.post.pk],
+                })
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertFalse(Task.objects.exists())
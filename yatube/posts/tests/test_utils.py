@@ -0,0 +1,56 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Follow, FollowCounter, Post, User
+from ..utils import chunked, map_chunks
+
+
+def texts(rows):
+    return [post.text for post in rows]
+
+
+class ChunkedIterationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='batch')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {number}')
+            for number in range(25)
+        )
+
+    def test_chunked_walks_by_primary_key(self):
+        """Пачки идут по возрастанию pk и покрывают таблицу целиком."""
+        chunks = list(chunked(Post.objects.all(), chunk_size=10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        pks = [post.pk for chunk in chunks for post in chunk]
+        self.assertEqual(pks, sorted(Post.objects.values_list(
+            'pk', flat=True)))
+        ids = list(chunked(Post.objects.values_list('pk', flat=True), 10))
+        self.assertEqual(sum(ids, []), pks)
+
+    def test_map_chunks_reports_progress(self):
+        """map_chunks сохраняет порядок и сообщает о прогрессе."""
+        progress = []
+        results = list(map_chunks(
+            Post.objects.filter(text__endswith='1'), texts, chunk_size=2,
+            progress=lambda done, total: progress.append((done, total))))
+        self.assertEqual(results, [['Пост 1', 'Пост 11'], ['Пост 21']])
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+
+    def test_batch_commands(self):
+        """Выгрузка и пересчёт счётчиков проходят по всей таблице."""
+        out = StringIO()
+        call_command('export_posts', chunk_size=7, stdout=out,
+                     stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[0]['author__username'], 'batch')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        FollowCounter.objects.all().delete()
+        call_command('rebuild_follow_counters', chunk_size=1,
+                     stdout=StringIO())
+        self.assertEqual(FollowCounter.objects.get(pk=author.pk).followers, 1)
@@ -1,14 +1,30 @@
+import hashlib
+import os
+import re
 import shutil
 import tempfile
+from datetime import timedelta
+from io import StringIO
+from wsgiref.util import setup_testing_defaults
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.paginator import Paginator
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from ..models import Follow, Group, Post, User
+from core import counters
+from core.fileserver import FileServer
+from core.tasks import run_pending
+
+from .. import hot, live, prerender, tags
+from ..models import (Comment, Follow, Group, HotEpoch, Mention, Post,
+                      PostTag, User, ViewCounter)
+from ..utils import get_page_window, post_views
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -39,6 +55,8 @@ class PostPagesTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
         cls.uploaded = SimpleUploadedFile(
             name='small.gif',
             content=small_gif,
@@ -104,7 +122,7 @@ class PostPagesTests(TestCase):
                 post_text = first_object.text
                 post_image = first_object.image
                 self.assertEqual(post_text, 'Тестовая запись')
-                self.assertEqual(post_image, 'posts/small.gif')
+                self.assertEqual(post_image, self.image_name)
 
     def test_post_with_image(self):
         """При отправке поста с картинкой создаётся запись в базе данных."""
@@ -116,6 +134,35 @@ class PostPagesTests(TestCase):
         )
         self.assertTrue(Post.objects.filter(text='Пост с картинкой').exists())
 
+    def test_same_image_is_stored_once(self):
+        """Одинаковые картинки разных постов хранятся одним файлом."""
+        post = Post.objects.create(
+            author=self.user2,
+            text='Тот же мем',
+            image=SimpleUploadedFile('meme.GIF', self.uploaded.read()),
+        )
+        self.assertEqual(post.image.name, self.image_name)
+        self.assertEqual(
+            Post.objects.filter(image=self.image_name).count(), 2)
+        directory = os.path.dirname(post.image.path)
+        self.assertEqual(os.listdir(directory), [os.path.basename(
+            self.image_name)])
+        post.delete()
+        self.assertTrue(os.path.exists(self.post.image.path))
+
+    def test_gc_media_removes_only_orphans(self):
+        """Сборка мусора удаляет только файлы без ссылок."""
+        orphan = Post.objects.create(
+            author=self.user,
+            text='Удалённый пост',
+            image=SimpleUploadedFile('other.gif', b'GIF89a orphan'),
+        )
+        orphan_path = orphan.image.path
+        orphan.delete()
+        call_command('gc_media', grace_period=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan_path))
+        self.assertTrue(os.path.exists(self.post.image.path))
+
     def test_create_or_edit_post_page_show_correct_context(self):
         """Шаблон create_post/edit сформирован с правильным контекстом."""
         templates_page_names = [
@@ -268,6 +315,72 @@ class PostPagesTests(TestCase):
             data=form_data)
         self.assertContains(response, 'Комментарий к посту')
 
+    def test_streaming_render_matches_full_render(self):
+        """Потоковый рендеринг отдаёт тот же HTML, что и обычный."""
+        Comment.objects.create(
+            post=self.post,
+            author=self.user2,
+            text='Комментарий для потока',
+        )
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                expected = self.guest_client.get(url).content
+                with self.settings(STREAMING_RENDER=True,
+                                   STREAMING_CHUNK_SIZE=64):
+                    response = self.guest_client.get(url)
+                # Страница с формой комментария анонимам отдаётся целиком.
+                if url.startswith('/posts/'):
+                    self.assertFalse(response.streaming)
+                    self.assertEqual(response.content, expected)
+                    continue
+                self.assertTrue(response.streaming)
+                self.assertEqual(
+                    b''.join(response.streaming_content), expected)
+
+    def test_streamed_page_with_form_sets_csrf_cookie(self):
+        """Страница с формой отдаёт cookie CSRF и при потоковом рендеринге."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with self.settings(STREAMING_RENDER=True):
+            response = client.get(url)
+            self.assertTrue(response.streaming)
+            body = b''.join(response.streaming_content).decode()
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        token = re.search(
+            r'name="csrfmiddlewaretoken" value="([^"]+)"', body).group(1)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'С токеном', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+    def test_post_card_urls_match_reverse(self):
+        """Ссылки карточки совпадают с результатом reverse()."""
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        for url in (
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:group_list', args=[self.group.slug]),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(response, f'href="{url}"')
+
+    def test_list_loads_text_preview_only(self):
+        """Списки читают только начало длинного текста."""
+        Post.objects.create(author=self.user2, text='а' * 400 + 'б' * 400)
+        response = self.guest_client.get(
+            reverse('posts:profile', args=[self.user2.username]))
+        post = response.context['page_obj'][0]
+        self.assertIn('text', post.get_deferred_fields())
+        self.assertContains(response, 'читать дальше')
+        self.assertNotContains(response, 'б' * 101)
+
 
 class PaginatorViewsTest(TestCase):
     """Проверяем пагинатор в шаблонах
@@ -320,3 +433,424 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     response.context['page_obj'].paginator.page('2').
                     object_list.count(), 3)
+
+    def test_page_window_is_limited(self):
+        """Навигация показывает первую, последнюю и соседние страницы."""
+        paginator = Paginator(range(1000), 10)
+        self.assertEqual(
+            get_page_window(paginator.page(50)),
+            [1, None, 48, 49, 50, 51, 52, None, 100])
+        self.assertEqual(
+            get_page_window(paginator.page(2)), [1, 2, 3, 4, None, 100])
+        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(response.context['page_window'], [1, 2])
+
+
+class HotFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='hot')
+        cls.old, cls.new = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def hot_posts(self):
+        response = self.client.get(reverse('posts:hot'))
+        return list(response.context['page_obj'])
+
+    def test_comments_raise_post_in_hot_feed(self):
+        """Обсуждаемый пост поднимается выше свежего."""
+        self.assertEqual(self.hot_posts(), [self.new, self.old])
+        for _ in range(4):
+            Comment.objects.create(post=self.old, author=self.user, text='+')
+        cache.clear()
+        self.assertEqual(self.hot_posts(), [self.old, self.new])
+        self.old.refresh_from_db()
+        self.assertIsNotNone(self.old.last_activity)
+
+    def test_decay_keeps_order_and_edit_keeps_score(self):
+        """Перенос отсчёта не меняет порядок, правка не сбрасывает счёт."""
+        Comment.objects.create(post=self.old, author=self.user, text='+')
+        scores = dict(Post.objects.values_list('pk', 'hot_score'))
+        hot.decay(timezone.now() + timedelta(hours=6))
+        decayed = dict(Post.objects.values_list('pk', 'hot_score'))
+        for pk, score in scores.items():
+            self.assertAlmostEqual(decayed[pk], score / 2, delta=score / 100)
+        post = Post.objects.get(pk=self.new.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.hot_score, decayed[post.pk])
+
+    def test_old_epoch_is_moved_instead_of_overflowing(self):
+        """Через 1024 периода полураспада пост и комментарий создаются."""
+        started = timezone.now() - timedelta(
+            seconds=hot.HALF_LIFE * 1100)
+        HotEpoch.objects.filter(pk=1).update(started=started)
+        self.assertGreater(hot.weight(1, timezone.now(), started), 0)
+        Comment.objects.create(post=self.old, author=self.user, text='+')
+        post = Post.objects.create(author=self.user, text='Новый')
+        self.assertGreater(HotEpoch.objects.get(pk=1).started, started)
+        self.assertEqual(self.hot_posts()[:2], [post, self.old])
+
+
+class PrerenderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(title='Группа', slug='static')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Готовая страница')
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        override = self.settings(PRERENDER_ROOT=root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def run_prerender(self):
+        out = StringIO()
+        call_command('prerender', stdout=out)
+        return out.getvalue()
+
+    def serve(self, url, **headers):
+        path, _, query = url.partition('?')
+        environ = {'PATH_INFO': path, 'QUERY_STRING': query,
+                   'REQUEST_METHOD': 'GET', **headers}
+        setup_testing_defaults(environ)
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return [b'django']
+
+        def start_response(status, response_headers):
+            self.served_headers = dict(response_headers)
+
+        return b''.join(FileServer(application)(environ, start_response))
+
+    def test_prerender_writes_pages_once(self):
+        """Страницы пишутся на диск и не перерисовываются без изменений."""
+        self.assertIn('Перерисовано: 6,', self.run_prerender())
+        for url in (reverse('about:author'), reverse('posts:index'),
+                    reverse('posts:group_list', args=(self.group.slug,)),
+                    reverse('posts:profile', args=(self.user.username,)),
+                    reverse('posts:post_detail', args=(self.post.pk,))):
+            self.assertTrue(os.path.isfile(prerender.file_name(url)), url)
+        self.assertIn('Перерисовано: 0, без изменений: 6',
+                      self.run_prerender())
+
+    def test_file_server_serves_prerendered_page_to_guests(self):
+        """Готовая страница отдаётся только запросам без сессии."""
+        self.run_prerender()
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertIn('Готовая страница'.encode(), self.serve(url))
+        self.assertEqual(self.served_headers['X-Frame-Options'],
+                         settings.X_FRAME_OPTIONS)
+        self.assertEqual(
+            self.serve(url, HTTP_COOKIE='sessionid=abc'), b'django')
+        self.assertEqual(self.serve(url + '?page=x'), b'django')
+
+    def test_prerender_does_not_count_views(self):
+        """Отрисовка страниц на диск не прибавляет просмотров."""
+        post_views.flush()
+        self.run_prerender()
+        self.assertEqual(post_views.flush(), 0)
+        self.assertFalse(ViewCounter.objects.exists())
+
+    def test_dot_username_does_not_escape_its_directory(self):
+        """Профиль пользователя «..» не пишется поверх главной."""
+        dots = User.objects.create_user(username='..')
+        Post.objects.create(author=dots, text='Пост пользователя')
+        url = reverse('posts:profile', args=(dots.username,))
+        self.assertIsNone(prerender.file_name(url))
+        self.run_prerender()
+        index = prerender.file_name(reverse('posts:index'))
+        with open(index, encoding='utf-8') as file:
+            self.assertIn('Последние обновления', file.read())
+        prerender.discard(author_ids=[dots.pk])
+        self.assertTrue(os.path.isfile(index))
+        self.assertEqual(self.serve(url), b'django')
+
+    def test_new_post_keeps_other_posts_of_author(self):
+        """Новый пост не перерисовывает остальные посты автора."""
+        self.run_prerender()
+        detail = prerender.file_name(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        with open(detail, encoding='utf-8') as file:
+            self.assertNotIn('Всего постов автора', file.read())
+        new = Post.objects.create(author=self.user, text='Второй пост')
+        prerender.flush()
+        self.assertTrue(os.path.exists(detail))
+        run_pending()
+        self.assertTrue(os.path.exists(prerender.file_name(
+            reverse('posts:post_detail', args=(new.pk,)))))
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertEqual(response.context['author_posts'], 2)
+
+    def test_comment_refreshes_only_its_post(self):
+        """Комментарий перерисовывает страницу своего поста."""
+        self.run_prerender()
+        index = prerender.file_name(reverse('posts:index'))
+        detail = prerender.file_name(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        index_mtime = os.stat(index).st_mtime_ns
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Новый комментарий')
+        # В TestCase коммита нет, поэтому его обработчик вызывается явно.
+        prerender.flush()
+        self.assertFalse(os.path.exists(detail))
+        run_pending()
+        with open(detail, encoding='utf-8') as file:
+            self.assertIn('Новый комментарий', file.read())
+        self.assertEqual(os.stat(index).st_mtime_ns, index_mtime)
+
+
+class FeedSitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='feeder')
+        cls.group = Group.objects.create(title='Лента', slug='feed')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост для ленты')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_answer_not_modified(self):
+        """Ленты в Atom, повторный запрос с ETag получает 304."""
+        for url in (reverse('posts:feed'),
+                    reverse('posts:group_feed', args=(self.group.slug,)),
+                    reverse('posts:author_feed', args=(self.user.username,))):
+            response = self.client.get(url)
+            self.assertTrue(
+                response['Content-Type'].startswith('application/atom+xml'))
+            self.assertContains(response, 'Пост для ленты')
+            repeated = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(repeated.status_code, 304)
+
+    def test_feed_cache_survives_comments_and_logins(self):
+        """Счёт популярности и вход на сайт не сбрасывают кеш ленты."""
+        url = reverse('posts:feed')
+        self.client.get(url)
+        Comment.objects.create(post=self.post, author=self.user, text='+')
+        self.client.force_login(self.user)
+        self.client.logout()
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(url), 'Пост для ленты')
+
+    def test_feed_changes_after_new_post(self):
+        url = reverse('posts:feed')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_sitemap_sections(self):
+        """Индекс карты ссылается на файл, в котором есть пост."""
+        response = self.client.get(reverse('posts:sitemap'))
+        section = reverse('posts:sitemap_section', args=(1,))
+        self.assertContains(response, section)
+        response = self.client.get(section)
+        self.assertContains(
+            response, reverse('posts:post_detail', args=(self.post.pk,)))
+        repeated = self.client.get(section,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.user, text='+')
+        changed = self.client.get(section,
+                                  HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(self.client.get(reverse(
+            'posts:sitemap_section', args=(2,))).status_code, 404)
+
+
+@override_settings(COUNTERS_FLUSH_INTERVAL=3600)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.popular, cls.quiet = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        post_views.flush()
+
+    def view(self, post, times=1):
+        for _ in range(times):
+            self.client.get(
+                reverse('posts:post_detail', args=(post.pk,)))
+
+    def test_views_are_buffered_and_flushed_in_one_batch(self):
+        """Просмотры копятся в памяти и пишутся одним запросом."""
+        self.view(self.popular, 3)
+        self.view(self.quiet)
+        self.assertFalse(ViewCounter.objects.exists())
+        self.assertEqual(post_views.value(self.popular.pk), 3)
+        with self.assertNumQueries(2):
+            self.assertEqual(post_views.flush(), 2)
+        self.view(self.popular)
+        post_views.flush()
+        self.assertEqual(
+            dict(ViewCounter.objects.values_list('post_id', 'views')),
+            {self.popular.pk: 4, self.quiet.pk: 1})
+
+    def test_idle_process_flushes_by_timer(self):
+        """Прибавления записываются и без новых просмотров."""
+        self.view(self.quiet)
+        self.assertEqual(counters.flush_due(), 0)
+        with self.settings(COUNTERS_FLUSH_INTERVAL=0):
+            self.assertEqual(counters.flush_due(), 1)
+        self.assertTrue(ViewCounter.objects.filter(post=self.quiet).exists())
+
+    def test_deleted_post_views_are_dropped(self):
+        post = Post.objects.create(author=self.user, text='Удалённый')
+        self.view(post)
+        post.delete()
+        self.assertEqual(post_views.flush(), 0)
+
+    def test_popular_sort_on_profile(self):
+        """Список автора сортируется по просмотрам."""
+        self.view(self.quiet)
+        self.view(self.popular, 2)
+        post_views.flush()
+        url = reverse('posts:profile', args=(self.user.username,))
+        response = self.client.get(url, {'sort': 'popular'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.popular, self.quiet])
+        self.assertEqual(response.context['page_prefix'],
+                         '?sort=popular&page=')
+
+
+@override_settings(LIVE_UPDATES=True, LIVE_POLL_INTERVAL=0,
+                   LIVE_HEARTBEAT=0, LIVE_MAX_DURATION=0.1)
+class LivePostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(title='Группа', slug='live')
+        cls.old = Post.objects.create(author=cls.user, text='Старый')
+        cls.posts = [
+            Post.objects.create(author=cls.user, group=cls.group,
+                                text=f'Новый {number}')
+            for number in range(2)
+        ]
+
+    def read(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_posts_after_since_are_counted_on_connect(self):
+        """Посты новее открытой страницы сразу попадают в счётчик."""
+        body = self.read(reverse('posts:live'), since=self.old.pk)
+        self.assertIn(live.event(2), body)
+        self.assertIn('retry: ', body)
+
+    def test_published_post_reaches_group_stream(self):
+        """Новый пост сообщества приходит подписчикам его канала."""
+        channels, posts = live.scope(self.group)
+        self.assertEqual(posts.count(), 2)
+        stream = live.stream(channels)
+        self.assertTrue(next(stream).startswith('retry: '))
+        live.publish(self.old.pk + 100, self.user.pk, self.group.pk)
+        self.assertEqual(next(stream), live.event(1, self.old.pk + 100))
+        stream.close()
+        self.assertEqual(live.hub.subscribers(), 0)
+
+    def test_bad_since_is_ignored(self):
+        for since in ('²', 'abc'):
+            with self.subTest(since=since):
+                body = self.read(reverse('posts:live'), since=since)
+                self.assertNotIn('event: posts', body)
+
+    def test_follow_stream_requires_login(self):
+        response = self.client.get(reverse('posts:follow_live'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_live_updates_are_off_by_default(self):
+        """Без LIVE_UPDATES страницы не открывают поток, а адреса нет."""
+        cache.clear()
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            'EventSource')
+        with self.settings(LIVE_UPDATES=False):
+            cache.clear()
+            self.assertNotContains(self.client.get(reverse('posts:index')),
+                                   'EventSource')
+            response = self.client.get(reverse('posts:live'))
+            self.assertEqual(response.status_code, 404)
+
+
+class TagTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader.one')
+
+    def test_extract(self):
+        """Теги приводятся к нижнему регистру, почта и сущности не теги."""
+        self.assertEqual(
+            tags.extract('#Django и #джанго, @reader.one. a@b.ru &#39;'),
+            ({'django', 'джанго'}, {'reader.one'}))
+
+    def test_saved_post_is_indexed_and_reindexed_on_edit(self):
+        post = Post.objects.create(
+            author=self.author, text='#Python для @reader.one и @writer')
+        self.assertEqual(
+            list(post.post_tags.values_list('tag__name', flat=True)),
+            ['python'])
+        # Упоминание самого себя во входящие не попадает.
+        self.assertEqual(
+            list(post.mentions.values_list('user', flat=True)),
+            [self.reader.pk])
+        post.text = 'Без тегов'
+        post.save()
+        self.assertFalse(PostTag.objects.exists())
+        self.assertFalse(Mention.objects.exists())
+
+    def test_index_posts_handles_bulk_imports_in_one_batch(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'#bulk #n{number} @reader.one')
+            for number in range(3)
+        ])
+        posts = list(Post.objects.all())
+        # Семь запросов на всю пачку и точка сохранения вокруг них.
+        with self.assertNumQueries(9):
+            self.assertEqual(tags.index_posts(posts), (6, 3))
+
+    def test_index_tags_command(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text='#old @reader.one')
+            for _ in range(3)
+        ])
+        out = StringIO()
+        call_command('index_tags', '--chunk-size', '2', stdout=out)
+        self.assertIn('Тегов у постов: 3, упоминаний: 3', out.getvalue())
+        self.assertEqual(PostTag.objects.count(), 3)
+
+    def test_tag_feed_and_mentions_inbox(self):
+        tagged = Post.objects.create(
+            author=self.author, text='#Новости для @reader.one')
+        Post.objects.create(author=self.author, text='Просто пост')
+        response = self.client.get(
+            reverse('posts:tag_posts', args=('НОВОСТИ',)))
+        self.assertTemplateUsed(response, 'posts/post_list.html')
+        self.assertEqual(list(response.context['page_obj']), [tagged])
+        self.assertContains(
+            response, reverse('posts:tag_posts', args=('новости',)))
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:mentions'))
+        self.assertEqual(list(response.context['page_obj']), [tagged])
+        response = self.client.get(
+            reverse('posts:tag_posts', args=('нет',)))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FeedCursor, Follow, Post
+from .utils import BATCH_SIZE, ITEMS_PER_PAGE
+
+UNREAD_KEY = 'unread:{}'
+UNREAD_TIMEOUT = 24 * 3600
+
+
+def get_cache():
+    # Счётчик нужен в шапке каждой страницы, поэтому лежит рядом с сессией.
+    return caches[getattr(settings, 'SESSION_CACHE_ALIAS', 'default')]
+
+
+def feed(user_id):
+    return Post.objects.filter(author__following__user_id=user_id)
+
+
+def cursor(user_id):
+    return FeedCursor.objects.filter(pk=user_id).first() or FeedCursor(
+        user_id=user_id)
+
+
+def unread_count(user_id):
+    """Число непрочитанных постов ленты подписок: из кеша или по ключу."""
+    cache = get_cache()
+    key = UNREAD_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = FeedCursor.objects.filter(pk=user_id).values_list(
+            'unread', flat=True).first() or 0
+        cache.set(key, count, UNREAD_TIMEOUT)
+    return count
+
+
+def mark_seen(user_id, last_seen_id):
+    """Отмечает ленту прочитанной до поста ``last_seen_id`` включительно.
+
+    Посты, вышедшие, пока страница строилась, остаются непрочитанными:
+    их немного, и они ищутся по диапазону первичного ключа.
+    """
+    unread = feed(user_id).filter(pk__gt=last_seen_id).count()
+    FeedCursor.objects.update_or_create(
+        user_id=user_id,
+        defaults={'last_seen_id': last_seen_id, 'unread': unread})
+    get_cache().set(UNREAD_KEY.format(user_id), unread, UNREAD_TIMEOUT)
+
+
+def first_unread(user_id, last_seen_id):
+    """Номер страницы ленты с самым старым непрочитанным постом и его id."""
+    unread = feed(user_id).filter(pk__gt=last_seen_id)
+    oldest = unread.order_by('pk').values_list('pk', flat=True).first()
+    if oldest is None:
+        return None, None
+    return -(-unread.count() // ITEMS_PER_PAGE), oldest
+
+
+def _delete(user_ids):
+    cache = get_cache()
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        cache.delete_many([UNREAD_KEY.format(user_id)
+                           for user_id in user_ids[start:start + BATCH_SIZE]])
+
+
+def forget(user_ids):
+    """Сбрасывает закешированные счётчики, и ещё раз после коммита:
+    иначе другой процесс мог бы успеть закешировать старое значение."""
+    user_ids = list(user_ids)
+    _delete(user_ids)
+    transaction.on_commit(lambda: _delete(user_ids))
+
+
+def recount(user_id):
+    """Пересчитывает непрочитанное после подписки или отписки.
+
+    Курсор не двигается: непрочитанными становятся посты нового автора
+    новее него, а посты автора, от которого отписались, уходят из счёта.
+    Курсор не создаётся: отписка бывает и при удалении пользователя.
+    """
+    last_seen_id = FeedCursor.objects.filter(pk=user_id).values_list(
+        'last_seen_id', flat=True).first()
+    if last_seen_id is None:
+        return
+    FeedCursor.objects.filter(pk=user_id).update(
+        unread=feed(user_id).filter(pk__gt=last_seen_id).count())
+    forget([user_id])
+
+
+def _fan_out_sql():
+    qn = connection.ops.quote_name
+    table = qn(FeedCursor._meta.db_table)
+    return (
+        f'INSERT INTO {table} ({qn("user_id")}, {qn("last_seen_id")}, '
+        f'{qn("unread")}) '
+        f'SELECT {qn("user_id")}, %s, 1 FROM {qn(Follow._meta.db_table)} '
+        f'WHERE {qn("author_id")} = %s '
+        f'ON CONFLICT ({qn("user_id")}) DO UPDATE SET '
+        f'{qn("unread")} = {table}.{qn("unread")} + 1'
+    )
+
+
+def followers(author_id):
+    return Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    """Новый пост прибавляет единицу к счётчикам всех подписчиков автора.
+
+    Один INSERT ... SELECT по подписчикам; у того, кто ленту ещё не
+    открывал, курсор появляется сразу за предыдущим постом, так что
+    непрочитанным считается только этот.
+    """
+    if not created:
+        return
+    with connection.cursor() as db:
+        db.execute(_fan_out_sql(), [instance.pk - 1, instance.author_id])
+    forget(followers(instance.author_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_removed(sender, instance, **kwargs):
+    readers = followers(instance.author_id)
+    FeedCursor.objects.filter(
+        user_id__in=readers, last_seen_id__lt=instance.pk,
+        unread__gt=0).update(unread=F('unread') - 1)
+    forget(readers)
@@ -0,0 +1,126 @@
+import os
+import warnings
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from .models import Upload
+
+ALLOWED_EXTENSIONS = ('.gif', '.jpeg', '.jpg', '.png', '.webp')
+READ_SIZE = 64 * 1024
+
+
+def upload_path(upload):
+    return os.path.join(settings.UPLOAD_CHUNKS_DIR, f'{upload.pk}.part')
+
+
+def start_upload(user, filename, size):
+    """Заводит загрузку и пустой файл, в который будут дописываться части."""
+    name = os.path.basename(filename)
+    if os.path.splitext(name)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise ValidationError('Этот тип файла не поддерживается.')
+    if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+        raise ValidationError('Недопустимый размер файла.')
+    upload = Upload.objects.create(user=user, filename=name, size=size)
+    os.makedirs(settings.UPLOAD_CHUNKS_DIR, exist_ok=True)
+    open(upload_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """Дописывает часть файла, читая тело запроса кусками по READ_SIZE.
+
+    Возвращает новое смещение. Если часть пришла не с того места или
+    параллельно с другой, ничего не пишется и возвращается None.
+    """
+    if offset != upload.received or offset + length > upload.size:
+        return None
+    written = 0
+    with open(upload_path(upload), 'r+b') as destination:
+        destination.seek(offset)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            destination.write(data)
+            written += len(data)
+    received = offset + written
+    updated = Upload.objects.filter(
+        pk=upload.pk, received=offset, status=Upload.RECEIVING).update(
+        received=received)
+    return received if updated else None
+
+
+def finish_if_ready(upload_id):
+    """Отправляет загрузку на проверку, когда есть и файл, и текст поста.
+
+    Условный UPDATE гарантирует, что задача будет поставлена ровно один раз,
+    какой бы из двух запросов ни пришёл последним.
+    """
+    from .tasks import process_upload
+
+    ready = Upload.objects.filter(
+        pk=upload_id,
+        status=Upload.RECEIVING,
+        submitted=True,
+        received=F('size'),
+    ).update(status=Upload.PROCESSING)
+    if ready:
+        process_upload.delay(str(upload_id))
+    return bool(ready)
+
+
+def remove_part(upload):
+    try:
+        os.remove(upload_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def fail(upload, error):
+    """Отклоняет загрузку и удаляет её файл."""
+    upload.status = Upload.FAILED
+    upload.error = error
+    upload.save(update_fields=('status', 'error'))
+    remove_part(upload)
+
+
+def expire_abandoned():
+    """Отклоняет загрузки, не дошедшие до проверки за UPLOAD_EXPIRE_AFTER.
+
+    Условный UPDATE не трогает загрузку, которую как раз отправили на
+    проверку. Возвращает число отклонённых загрузок.
+    """
+    deadline = timezone.now() - timedelta(
+        seconds=settings.UPLOAD_EXPIRE_AFTER)
+    expired = 0
+    for upload in Upload.objects.filter(
+            status=Upload.RECEIVING, created__lt=deadline).only('pk'):
+        if Upload.objects.filter(pk=upload.pk, status=Upload.RECEIVING).update(
+                status=Upload.FAILED, error='Загрузка не завершена.'):
+            remove_part(upload)
+            expired += 1
+    return expired
+
+
+def validate_image(path):
+    """Проверяет картинку целиком, не доверяя заголовку файла."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            with Image.open(path) as image:
+                width, height = image.size
+                if (max(width, height) > settings.UPLOAD_MAX_DIMENSION
+                        or width * height > settings.UPLOAD_MAX_PIXELS):
+                    raise ValidationError('Слишком большое изображение.')
+                image.verify()
+            with Image.open(path) as image:
+                image.load()
+        except (OSError, SyntaxError, Image.DecompressionBombError,
+                Image.DecompressionBombWarning) as error:
+            raise ValidationError(
+                f'Файл не является корректным изображением: {error}')
@@ -1,22 +1,48 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index,
          name='index'),
+    path('hot/', views.hot,
+         name='hot'),
     path('group/<slug:slug>/', views.group_posts,
          name='group_list'),
     path('profile/<str:username>/', views.profile,
          name='profile'),
+    path('tags/<str:name>/', views.tag_posts,
+         name='tag_posts'),
+    path('mentions/', views.mentions,
+         name='mentions'),
+    path('feed/', feeds.PostFeed(),
+         name='feed'),
+    path('group/<slug:slug>/feed/', feeds.GroupFeed(),
+         name='group_feed'),
+    path('profile/<str:username>/feed/', feeds.AuthorFeed(),
+         name='author_feed'),
+    path('live/', views.live_posts,
+         name='live'),
+    path('group/<slug:slug>/live/', views.live_posts,
+         name='group_live'),
+    path('follow/live/', views.live_posts, {'follow': True},
+         name='follow_live'),
+    path('sitemap.xml', views.sitemap_index,
+         name='sitemap'),
+    path('sitemap-<int:number>.xml', views.sitemap_section,
+         name='sitemap_section'),
     path('posts/<int:post_id>/', views.post_detail,
          name='post_detail'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
     path('create/', views.post_create,
          name='post_create'),
+    path('uploads/', views.upload_start,
+         name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk,
+         name='upload_chunk'),
     path('posts/<int:post_id>/edit/', views.post_edit,
          name='post_edit'),
     path('follow/', views.follow_index,
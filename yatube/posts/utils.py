@@ -1,14 +1,224 @@
+import multiprocessing
+
 from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import F, Max
+from django.db.models.functions import Substr
+from django.utils.functional import cached_property
+
+from core import versions
+from core.counters import BufferedCounter
 
 ITEMS_PER_PAGE = 10
+# Сколько соседних страниц показывать слева и справа от текущей.
+PAGE_WINDOW = 2
+CONTENT_GENERATION_KEY = 'posts:generation'
+# Размер пачки при обходе больших таблиц.
+BATCH_SIZE = 1000
+# Сколько символов текста поста показывать в карточке списка.
+PREVIEW_LENGTH = 500
+# Поля, которые нужны includes/post_card.html.
+CARD_FIELDS = ('pub_date', 'image', 'author__username', 'group__slug')
+# Порядки постов в списках автора и сообщества: ?sort=<ключ>.
+SORTS = {
+    'new': ('-pub_date',),
+    'popular': (F('view_counter__views').desc(nulls_last=True), '-pk'),
+}
+
+post_views = BufferedCounter('posts.ViewCounter', 'views')
+
+
+def get_page_window(page_obj, window=PAGE_WINDOW):
+    """Номера страниц для навигации: первая, последняя и соседи текущей.
+
+    Пропуски между ними обозначаются None.
+    """
+    last = page_obj.paginator.num_pages
+    current = page_obj.number
+    pages = sorted({1, last} | set(range(
+        max(1, current - window), min(last, current + window) + 1)))
+    page_window = []
+    for number in pages:
+        if page_window and number - page_window[-1] > 1:
+            page_window.append(None)
+        page_window.append(number)
+    return page_window
+
+
+def card_queryset(queryset):
+    """Загружает для карточек постов только нужные им столбцы.
+
+    Вместо полных строк поста и автора (с хешем пароля, почтой и т.п.)
+    читаются дата, картинка, имя автора и slug группы, а из текста —
+    только начало длиной PREVIEW_LENGTH + 1 символ в поле preview:
+    лишний символ говорит шаблону, что текст обрезан.
+    """
+    return queryset.select_related('author', 'group').only(
+        *CARD_FIELDS).annotate(
+            preview=Substr('text', 1, PREVIEW_LENGTH + 1))
+
+
+def sort_posts(queryset, request):
+    """Упорядочивает посты по параметру sort; возвращает и его ключ."""
+    sort = request.GET.get('sort')
+    if sort not in SORTS:
+        sort = 'new'
+    return queryset.order_by(*SORTS[sort]), sort
+
+
+def content_generation():
+    """Поколение контента: входит в ключи кэша страниц.
+
+    Хранится в общем для процессов core.versions, чтобы задача
+    модерации в воркере сбрасывала страницы и в веб-процессах.
+    """
+    return versions.get(CONTENT_GENERATION_KEY)
+
+
+def bump_content_generation():
+    """Разом делает устаревшими все закэшированные страницы с постами."""
+    versions.bump(CONTENT_GENERATION_KEY)
 
 
 def get_paginator(queryset, request):
     paginator = Paginator(queryset, ITEMS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    # Ссылки пагинатора сохраняют остальные параметры, например sort.
+    query = request.GET.copy()
+    query.pop('page', None)
     return {
         'paginator': paginator,
         'page_number': page_number,
         'page_obj': page_obj,
+        'page_window': get_page_window(page_obj),
+        'page_prefix': '?' + (query.urlencode() + '&' if query else '')
+        + 'page=',
     }
+
+
+def estimate_count(queryset):
+    """Примерное число строк таблицы без COUNT(*) по всей таблице.
+
+    Берётся из статистики планировщика (pg_class.reltuples или sqlite_stat1
+    после ANALYZE), а если её нет — из максимального первичного ключа.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    estimate = None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+        elif connection.vendor == 'sqlite' and 'sqlite_stat1' in (
+                connection.introspection.table_names(cursor)):
+            sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+        else:
+            sql = None
+        if sql is not None:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+            estimate = row and row[0]
+    if isinstance(estimate, str):
+        estimate = int(estimate.split()[0])
+    if estimate and estimate > 0:
+        return int(estimate)
+    return queryset.aggregate(last=Max('pk'))['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для больших таблиц: точный COUNT(*) не выполняется.
+
+    Без фильтров число строк оценивается по статистике таблицы,
+    с фильтрами считается не больше COUNT_LIMIT строк.
+    """
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimate_count(queryset)
+        return queryset[:self.COUNT_LIMIT].count()
+
+
+def _pk_of(row, queryset):
+    if isinstance(row, models.Model):
+        return row.pk
+    if isinstance(row, dict):
+        if 'pk' in row:
+            return row['pk']
+        return row[queryset.model._meta.pk.attname]
+    if isinstance(row, tuple):
+        return row[0]
+    return row
+
+
+def chunked(queryset, chunk_size=BATCH_SIZE):
+    """Обходит queryset пачками в порядке первичного ключа.
+
+    Каждая пачка — отдельный запрос «pk > последний из прошлой пачки
+    LIMIT chunk_size», поэтому память не растёт с размером таблицы,
+    а запрос не замедляется к концу, как OFFSET. Годится и для values()
+    (с pk среди полей), и для values_list() с pk на первом месте.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(
+            pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = _pk_of(chunk[-1], queryset)
+
+
+def _process_range(job):
+    # QuerySet при pickle вычисляется целиком, поэтому в воркер уходят
+    # его составные части, а сам он собирается заново.
+    model, query, iterable_class, fields, func, first, last = job
+    queryset = model._default_manager.all()
+    queryset.query = query
+    queryset._iterable_class = iterable_class
+    queryset._fields = fields
+    rows = list(queryset.filter(pk__gte=first, pk__lte=last).order_by('pk'))
+    return len(rows), func(rows)
+
+
+def map_chunks(queryset, func, chunk_size=BATCH_SIZE, processes=1,
+               progress=None):
+    """Применяет ``func`` к пачкам queryset и по одному выдаёт результаты.
+
+    При processes > 1 пачки обрабатываются пулом процессов: главный
+    процесс читает только первичные ключи и раздаёт воркерам диапазоны,
+    а строки каждой пачки воркер загружает сам, поэтому ``func`` должна
+    быть функцией уровня модуля. Результаты идут в порядке пачек.
+    ``progress(done, total)`` вызывается после каждой пачки.
+    """
+    total = queryset.count() if progress else None
+    jobs = (
+        (queryset.model, queryset.query, queryset._iterable_class,
+         queryset._fields, func, pks[0], pks[-1])
+        for pks in chunked(
+            queryset.values_list('pk', flat=True), chunk_size)
+    )
+    pool = None
+    if processes > 1:
+        # Соединения с БД не должны достаться воркерам по наследству.
+        connections.close_all()
+        pool = multiprocessing.Pool(processes)
+        outcomes = pool.imap(_process_range, jobs)
+    else:
+        outcomes = map(_process_range, jobs)
+    done = 0
+    try:
+        for size, result in outcomes:
+            done += size
+            if progress:
+                progress(done, total)
+            yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
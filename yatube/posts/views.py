@@ -1,9 +1,31 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import ValidationError
+from django.http import (Http404, HttpResponse, HttpResponseNotAllowed,
+                         JsonResponse, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_POST
+
+from core import querycache
+from core.counters import INTERNAL_REQUEST, counts
+from core.querycache import cached
+from core.ratelimit import ratelimit
+from core.singleflight import coalesce
+from core.streaming import render_page
 
+from . import follows, live, sitemaps, unread, uploads
+from .feeds import conditional
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import get_paginator
+from .models import FollowCounter, Group, Post, Tag, Upload, User
+from .tasks import warm_thumbnail
+from .utils import (card_queryset, content_generation, get_paginator,
+                    post_views, sort_posts)
 
 
 def index(request):
@@ -11,55 +33,110 @@ def index(request):
     title = 'Последние обновления на сайте'
     context = {
         'title': title,
+        'content_generation': content_generation(),
+    }
+    context.update(get_paginator(card_queryset(Post.objects.all()), request))
+    return render_page(request, template, context)
+
+
+def hot(request):
+    template = 'posts/hot.html'
+    title = 'Обсуждаемое'
+    context = {
+        'title': title,
+        'hot': True,
+        'content_generation': content_generation(),
     }
     context.update(get_paginator(
-        Post.objects.select_related('author', 'group'), request))
-    return render(request, template, context)
+        card_queryset(Post.objects.filter(hot_score__gt=0)).order_by(
+            '-hot_score', '-pk'), request))
+    return render_page(request, template, context)
 
 
+@coalesce
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
+    group = get_object_or_404(Group.objects.cached(), slug=slug)
     title = f'Записи сообщества {group}'
+    posts, sort = sort_posts(card_queryset(group.posts.all()), request)
     context = {
         'group': group,
         'title': title,
+        'sort': sort,
     }
-    context.update(get_paginator(group.posts.all(), request))
-    return render(request, template, context)
+    context.update(get_paginator(posts, request))
+    if request.user.is_authenticated:
+        context['followed_ids'] = follows.graph.followed_among(
+            request.user.id,
+            {post.author_id for post in context['page_obj'].object_list})
+    return render_page(request, template, context)
 
 
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(cached(User), username=username)
     title = f'Профайл пользователя {username}'
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author).exists()
+    following = request.user.is_authenticated and follows.graph.follows(
+        request.user.id, author.id)
+    counter = FollowCounter.objects.filter(pk=author.pk).first()
+    posts, sort = sort_posts(card_queryset(author.posts.all()), request)
     context = {
         'title': title,
         'author': author,
         'following': following,
+        'followers_count': counter.followers if counter else 0,
+        'sort': sort,
     }
-    context.update(get_paginator(author.posts.all(), request))
-    return render(request, template, context)
+    context.update(get_paginator(posts, request))
+    return render_page(request, template, context)
+
+
+def tag_posts(request, name):
+    template = 'posts/post_list.html'
+    tag = get_object_or_404(Tag, name=name.lower())
+    context = {
+        'title': f'Записи с тегом #{tag}',
+    }
+    context.update(get_paginator(
+        card_queryset(Post.objects.filter(post_tags__tag=tag)), request))
+    return render_page(request, template, context)
+
+
+@login_required
+def mentions(request):
+    template = 'posts/post_list.html'
+    context = {
+        'title': f'Упоминания пользователя {request.user}',
+    }
+    context.update(get_paginator(card_queryset(
+        Post.objects.filter(mentions__user=request.user)), request))
+    return render_page(request, template, context)
 
 
+@counts(post_views, 'post_id')
+@coalesce
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
     post = get_object_or_404(Post, pk=post_id)
     title = f'Пост {post.text[:30]}'
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     comment_form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'title': title,
         'comment_form': comment_form,
         'comments': comments,
+        # На сохранённой на диск странице числа постов автора нет:
+        # иначе каждый новый пост перерисовывал бы все посты автора.
+        'author_posts': None if request.META.get(INTERNAL_REQUEST)
+        else post.author.posts.count(),
     }
-    return render(request, template, context)
+    return render_page(request, template, context)
 
 
 @login_required
+@ratelimit('post-ip', key='ip')
+@ratelimit('post')
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(request.POST or None,
@@ -67,14 +144,69 @@ def post_create(request):
     context = {
         'form': form,
     }
+    upload_id = request.POST.get('upload')
     if request.method == 'POST' and form.is_valid():
+        if upload_id:
+            # Пост с картинкой, загруженной частями, публикует воркер
+            # после проверки изображения.
+            upload = get_object_or_404(
+                Upload, pk=upload_id, user=request.user,
+                status=Upload.RECEIVING)
+            upload.text = form.cleaned_data['text']
+            upload.group = form.cleaned_data['group']
+            upload.submitted = True
+            upload.save(update_fields=('text', 'group', 'submitted'))
+            uploads.finish_if_ready(upload.pk)
+            return redirect('posts:profile', request.user)
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        if post.image:
+            warm_thumbnail.delay(post.pk)
         return redirect('posts:profile', request.user)
     return render(request, template, context)
 
 
+@login_required
+@require_POST
+def upload_start(request):
+    try:
+        upload = uploads.start_upload(
+            request.user,
+            request.POST.get('filename', ''),
+            int(request.POST.get('size', 0)),
+        )
+    except (ValueError, ValidationError) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'id': str(upload.pk), 'offset': 0}, status=201)
+
+
+@login_required
+def upload_chunk(request, upload_id):
+    """GET сообщает, с какого байта продолжать, PUT дописывает часть."""
+    upload = get_object_or_404(Upload, pk=upload_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse({
+            'offset': upload.received,
+            'status': upload.status,
+            'error': upload.error,
+        })
+    if request.method != 'PUT':
+        return HttpResponseNotAllowed(['GET', 'PUT'])
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Нужны Upload-Offset и Content-Length'},
+                            status=400)
+    received = uploads.write_chunk(upload, offset, request, length)
+    if received is None:
+        return JsonResponse({'offset': upload.received}, status=409)
+    if received == upload.size:
+        uploads.finish_if_ready(upload.pk)
+    return JsonResponse({'offset': received})
+
+
 @login_required
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
@@ -92,12 +224,16 @@ def post_edit(request, post_id):
     }
 
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data and post.image:
+            warm_thumbnail.delay(post.pk)
         return redirect('posts:post_detail', post_id=post_id)
     return render(request, template, context)
 
 
 @login_required
+@ratelimit('comment-ip', key='ip')
+@ratelimit('comment')
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -113,29 +249,103 @@ def add_comment(request, post_id):
 def follow_index(request):
     template = 'posts/follow.html'
     title = f'Подписки пользователя {request.user}'
-    post_list = Post.objects.filter(
-        author__following__user=request.user).select_related('author')
+    cursor = unread.cursor(request.user.id)
+    if request.GET.get('unread'):
+        page, oldest = unread.first_unread(
+            request.user.id, cursor.last_seen_id)
+        if page is not None:
+            return redirect(
+                f'{reverse("posts:follow_index")}?page={page}#post-{oldest}')
+    post_list = card_queryset(unread.feed(request.user.id))
+    suggested_ids = follows.graph.suggestions(request.user.id)
+    suggested = User.objects.in_bulk(suggested_ids)
     context = {
         'title': title,
+        'suggested_authors': [
+            suggested[pk] for pk in suggested_ids if pk in suggested],
+        'last_seen_id': cursor.last_seen_id,
     }
     context.update(get_paginator(post_list, request))
-    return render(request, template, context)
+    page_obj = context['page_obj']
+    newest = max((post.pk for post in page_obj), default=0)
+    if page_obj.number == 1 and newest > cursor.last_seen_id:
+        unread.mark_seen(request.user.id, newest)
+    return render_page(request, template, context)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if not Follow.objects.filter(
-            user=request.user,
-            author=author).exists() and author != request.user:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author)
+    follows.follow(request.user, author)
     return redirect('posts:profile', username=author.username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.get(user=request.user, author=author).delete()
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username=author.username)
+
+
+def live_posts(request, slug=None, follow=False):
+    """Server-Sent Events о новых постах сайта, сообщества или подписок.
+
+    ``since`` — id самого нового поста на открытой странице: посты новее
+    него сразу попадают в счётчик, в том числе после переподключения.
+    """
+    if not settings.LIVE_UPDATES:
+        raise Http404('Обновления в реальном времени выключены')
+    if follow and not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    group = (get_object_or_404(Group.objects.cached(), slug=slug)
+             if slug else None)
+    channels, posts = live.scope(group, request.user if follow else None)
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        since = None
+    initial = (posts.filter(pk__gt=since)[:live.MAX_INITIAL].count()
+               if since is not None else 0)
+    response = StreamingHttpResponse(
+        live.stream(channels, initial), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Иначе nginx копит поток в буфере и события приходят пачками.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def site_base(request):
+    return request.build_absolute_uri('/')[:-1]
+
+
+@conditional
+def sitemap_index(request):
+    body = sitemaps.render_index(
+        site_base(request), sitemaps.section_signatures())
+    return HttpResponse(body, content_type='application/xml')
+
+
+def sitemap_section(request, number):
+    """Файл карты сайта с постами одного диапазона первичных ключей.
+
+    Файл строится заново, только если изменилась его подпись: число
+    постов, последний pk или время последней активности в диапазоне.
+    """
+    signature = sitemaps.section_signature(number)
+    if not signature['count']:
+        raise Http404
+    base = site_base(request)
+    etag = quote_etag(hashlib.sha1(
+        f'{base}|{number}|{sorted(signature.items())}'.encode()).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    cache = querycache.get_cache()
+    key = f'sitemap:section:{etag}'
+    body = cache.get(key)
+    if body is None:
+        body = sitemaps.render_section(base, number)
+        cache.set(key, body, sitemaps.SITEMAP_CACHE_TIMEOUT)
+    response = HttpResponse(body, content_type='application/xml')
+    response['ETag'] = etag
+    return response
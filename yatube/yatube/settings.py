@@ -33,6 +33,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,6 +63,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'posts.context_processors.unread_count',
+                'posts.context_processors.live_updates',
             ],
         },
     },
@@ -120,6 +124,21 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+if not DEBUG:
+    # collectstatic добавляет к именам хеш содержимого и сжимает файлы
+    # заранее; core.fileserver отдаёт их с кешированием на год.
+    STATICFILES_STORAGE = (
+        'core.staticfiles.CompressedManifestStaticFilesStorage')
+
+# Готовый HTML анонимных страниц (posts.prerender, `manage.py prerender`):
+# core.fileserver отдаёт его посетителям без сессии в обход Django.
+PRERENDER_ROOT = None
+
+if not DEBUG:
+    PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerendered')
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -133,8 +152,133 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузка картинок частями: куда складывать недокачанные файлы
+# и какие изображения принимать.
+UPLOAD_CHUNKS_DIR = os.path.join(BASE_DIR, 'upload_chunks')
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_MAX_DIMENSION = 10000
+UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+# Через сколько секунд незавершённая загрузка считается брошенной
+# (команда expire_uploads).
+UPLOAD_EXPIRE_AFTER = 24 * 60 * 60
+
+# Потоковый рендеринг страниц со списками: шапка уходит клиенту сразу,
+# карточки и комментарии — частями по мере готовности.
+STREAMING_RENDER = False
+STREAMING_CHUNK_SIZE = 8192
+
+# Фоновые задачи core.tasks: при TASKS_EAGER выполняются сразу в запросе,
+# иначе ждут воркеров `manage.py run_workers`.
+TASKS_EAGER = False
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    # Счётчики core.ratelimit: общие для всех процессов-воркеров хоста.
+    # FileBasedCache при переполнении удаляет случайные записи, а значит,
+    # и текущие окна лимитов, поэтому места с запасом на окна всех
+    # активных пользователей и адресов, а чистится десятая часть.
+    'ratelimit': {
+        'BACKEND': 'core.cache.SharedFileCache',
+        'LOCATION': os.path.join(BASE_DIR, 'ratelimit_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000, 'CULL_FREQUENCY': 10},
+    },
+}
+
+RATELIMIT_CACHE = 'ratelimit'
+
+# Сессии читаются из общего для процессов кеша и записываются сразу
+# и в кеш, и в БД; пользователь сессии кешируется в памяти процесса.
+# Вытесненная сессия не теряется, а читается из БД, но каждое
+# вытеснение — лишний запрос, поэтому места — на все живые сессии.
+CACHES['sessions'] = {
+    'BACKEND': 'core.cache.SharedFileCache',
+    'LOCATION': os.path.join(BASE_DIR, 'session_cache'),
+    'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 10},
+}
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+AUTHENTICATION_BACKENDS = ['core.auth.CachedModelBackend']
+
+# Кеш результатов запросов core.querycache: результаты должны быть
+# общими для процессов, иначе запись в одном процессе не сбросит кеш
+# в другом. Из статистики попаданий учитывается каждое сотое обращение.
+CACHES['queries'] = {
+    'BACKEND': 'core.cache.SharedFileCache',
+    'LOCATION': os.path.join(BASE_DIR, 'query_cache'),
+    'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_FREQUENCY': 4},
+}
+QUERYCACHE_ALIAS = 'queries'
+QUERYCACHE_TIMEOUT = 300
+QUERYCACHE_STATS_SAMPLE = 0.01
+
+# Версии общих для процессов данных (core.versions): таблиц для кеша
+# запросов, графа подписок, пользователей сессий. Вытесненная версия
+# заменяется новой и лишь заставляет перечитать данные.
+CACHES['versions'] = {
+    'BACKEND': 'core.cache.SharedFileCache',
+    'LOCATION': os.path.join(BASE_DIR, 'versions_cache'),
+    'OPTIONS': {'MAX_ENTRIES': 10000},
+}
+VERSIONS_CACHE = 'versions'
+
+# Одинаковые одновременные анонимные запросы к популярным страницам
+# строятся один раз; через этот кеш — и между процессами.
+SINGLEFLIGHT_CACHE = 'queries'
+
+# Защита от перегрузки (core.middleware.AdmissionControlMiddleware):
+# сколько запросов каждого класса процесс обрабатывает одновременно
+# и сколько секунд запрос ждёт места, прежде чем получить 503.
+ADMISSION_LIMITS = {'read': 32, 'write': 8, 'admin': 4}
+ADMISSION_QUEUE_TIMEOUT = {'read': 1.0, 'write': 2.0, 'admin': 0.5}
+# Деградированный режим: доля занятых слотов чтения или среднее
+# ожидание слота (с), после которых чтения отдаются из кеша.
+ADMISSION_DEGRADED_AT = 0.75
+ADMISSION_DEGRADED_QUEUE_TIME = 0.2
+# Копии анонимных страниц для деградированного режима: только списки
+# и посты, в своём кеше процесса, чтобы не вытеснять фрагменты шаблонов.
+CACHES['stale'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'stale',
+    'OPTIONS': {'MAX_ENTRIES': 2000},
+}
+ADMISSION_STALE_CACHE = 'stale'
+ADMISSION_STALE_URLS = (
+    'posts:index', 'posts:hot', 'posts:group_list', 'posts:profile',
+    'posts:tag_posts', 'posts:post_detail',
+)
+ADMISSION_STALE_TIMEOUT = 600
+ADMISSION_RETRY_AFTER = 5
+
+# Server-Sent Events о новых постах (posts.live): как часто каждый процесс
+# проверяет посты из других процессов, пинг и предельная длина потока (с).
+# Каждый открытый поток занимает поток воркера на LIVE_MAX_DURATION,
+# поэтому включать только при асинхронных воркерах (gevent, eventlet).
+LIVE_UPDATES = False
+LIVE_POLL_INTERVAL = 1
+LIVE_HEARTBEAT = 15
+LIVE_MAX_DURATION = 300
+
+# Счётчики просмотров (core.counters) копятся в памяти процесса и
+# записываются в БД раз в столько секунд.
+COUNTERS_FLUSH_INTERVAL = 10
+
+if DEBUG:
+    # Под runserver и в тестах просмотры записываются сразу.
+    COUNTERS_FLUSH_INTERVAL = 0
+    # У runserver один процесс, а тесты не должны делить счётчики,
+    # сессии и кеш запросов между запусками.
+    for alias in ('ratelimit', 'sessions', 'queries', 'versions'):
+        CACHES[alias] = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': alias,
+        }
+
+# Лимиты на создание контента: на пользователя и отдельно на адрес.
+RATELIMITS = {
+    'post': '10/m',
+    'post-ip': '30/m',
+    'comment': '20/m',
+    'comment-ip': '60/m',
 }
@@ -3,6 +3,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import load_metrics
+
 handler404 = 'core.views.page_not_found'
 handler403csrf = 'core.views.csrf_failure'
 handler403 = 'core.views.permission_denied'
@@ -10,6 +12,7 @@ handler403 = 'core.views.permission_denied'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/load/', load_metrics, name='load_metrics'),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),